@@ -0,0 +1,365 @@
+"""
+On-disk cache of the verdicts of ECC2025.testing.
+
+A check decorated with cached stores what it prints under a content hash of
+its arguments, so an identical resubmission replays the stored verdict instead
+of running its simulations again. Set ECC2025_CACHE_DIR to move the cache and
+ECC2025_NO_CACHE=1 to disable it. DirectoryStore, the size-bounded directory
+behind it, is shared with the QPY store of the Shor workshop.
+"""
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import io
+import os
+import sys
+import sysconfig
+import tempfile
+import time
+import types
+import uuid
+from typing import Callable, Optional, TypeVar
+
+import numpy as np
+import qiskit
+from qiskit import QuantumCircuit, qpy
+from qiskit.circuit import Parameter
+from qiskit.quantum_info import Operator, Pauli, SparsePauliOp, Statevector
+from qiskit.transpiler import CouplingMap
+
+
+DEFAULT_DIRECTORY = os.environ.get(
+    "ECC2025_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ecc2025", "verdicts")
+)
+
+# temporary files older than this were left by an interrupted write
+STALE_SECONDS = 3600
+
+# functions and classes installed here are library code, identified by name
+LIBRARY_PATHS = tuple(
+    os.path.realpath(sysconfig.get_path(name)) for name in ("stdlib", "platstdlib", "purelib", "platlib")
+)
+
+
+T = TypeVar("T")
+
+
+class Uncacheable(Exception):
+    """The object has no canonical form, the check runs without the cache."""
+
+
+class DirectoryStore:
+    """Size-bounded directory of entries, one file per key ending in suffix.
+
+    Entries are written atomically so several processes can share the
+    directory. Reading an entry marks it as used, and the least recently used
+    ones are removed once the directory exceeds max_bytes.
+    """
+
+    suffix = ""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def size(self) -> int:
+        """Total bytes taken by the entries of the store."""
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def clear(self):
+        for path in self._entries():
+            os.remove(path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries(self) -> list[str]:
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(self.suffix)
+        ]
+
+    def _read(self, key: str, load: Callable[[str], T]) -> Optional[T]:
+        """load(path) of the entry under key, None if there is none."""
+        path = self._path(key)
+        try:
+            value = load(path)
+        except FileNotFoundError:
+            return None
+
+        # the modification time orders the entries for eviction, a concurrent
+        # eviction may have removed the file since it was read
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write(self, key: str, dump: Callable):
+        """Stores under key what dump(file) writes into a binary file."""
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                dump(file)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        self._remove_stale_files()
+
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _remove_stale_files(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > STALE_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ResultCache(DirectoryStore):
+    """Size-bounded cache of the output printed by the checks.
+
+    Each entry is a file named after the SHA-256 of the check name, its grader
+    version and the canonical form of its arguments.
+    """
+
+    suffix = ".txt"
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 64 * 2**20):
+        super().__init__(directory, max_bytes)
+
+    def key(self, test, arguments: dict) -> Optional[str]:
+        """Content hash of one call of test, None if an argument has no canonical form."""
+        digest = hashlib.sha256()
+        digest.update(test.__qualname__.encode())
+        digest.update(grader_version(test).encode())
+        try:
+            for name in sorted(arguments):
+                digest.update(name.encode())
+                _update(digest, arguments[name], set())
+        except Uncacheable:
+            return None
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._read(key, _read_text)
+
+    def put(self, key: str, output: str):
+        self._write(key, lambda file: file.write(output.encode("utf-8")))
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+@functools.lru_cache(maxsize=None)
+def grader_version(test) -> str:
+    """Hash of the module defining test and of the versions its verdicts depend on.
+
+    Any edit of the checks invalidates every entry, helpers included.
+    """
+    import qiskit_aer
+
+    source = inspect.getsource(sys.modules[test.__module__])
+    payload = "\n".join(
+        [source, sys.version, np.__version__, qiskit.__version__, qiskit_aer.__version__]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def canonical_hash(obj) -> str:
+    """SHA-256 of the canonical form of obj; raises Uncacheable if it has none."""
+    digest = hashlib.sha256()
+    _update(digest, obj, set())
+    return digest.hexdigest()
+
+
+_cache = None
+
+
+def cached(test):
+    """Replays the stored output of test for arguments it has already seen."""
+    signature = inspect.signature(test)
+
+    @functools.wraps(test)
+    def wrapper(*args, **kwargs):
+        global _cache
+        if os.environ.get("ECC2025_NO_CACHE"):
+            return test(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if _cache is None:
+            _cache = ResultCache()
+        key = _cache.key(test, bound.arguments)
+        if key is None:
+            return test(*args, **kwargs)
+
+        output = _cache.get(key)
+        if output is None:
+            buffer = io.StringIO()
+            with contextlib.redirect_stdout(buffer):
+                test(*args, **kwargs)
+            output = buffer.getvalue()
+            _cache.put(key, output)
+
+        print(output, end="")
+
+    return wrapper
+
+
+def _update(digest, obj, visiting: set):
+    """Feeds the canonical form of obj to digest."""
+    def tag(name):
+        digest.update(b"\x00" + name.encode() + b"\x00")
+
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        tag(type(obj).__name__)
+        digest.update(repr(obj).encode())
+    elif isinstance(obj, np.generic):
+        _update(digest, obj.item(), visiting)
+    elif isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            raise Uncacheable(obj)
+        tag(f"ndarray {obj.dtype.str} {obj.shape}")
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, QuantumCircuit):
+        tag("QuantumCircuit")
+        digest.update(_qpy_bytes(obj))
+    elif isinstance(obj, SparsePauliOp):
+        tag("SparsePauliOp")
+        digest.update(" ".join(obj.paulis.to_labels()).encode())
+        _update(digest, np.asarray(obj.coeffs, dtype=complex), visiting)
+    elif isinstance(obj, Pauli):
+        tag("Pauli")
+        digest.update(obj.to_label().encode())
+    elif isinstance(obj, CouplingMap):
+        tag("CouplingMap")
+        _update(digest, sorted(obj.get_edges()), visiting)
+    elif isinstance(obj, (Operator, Statevector)):
+        tag(f"{type(obj).__name__} {obj.dims()}")
+        _update(digest, obj.data, visiting)
+    elif isinstance(obj, (list, tuple)):
+        tag(f"{type(obj).__name__} {len(obj)}")
+        for item in obj:
+            _update(digest, item, visiting)
+    elif isinstance(obj, dict):
+        tag(f"dict {len(obj)}")
+        for key in sorted(obj, key=repr):
+            _update(digest, key, visiting)
+            _update(digest, obj[key], visiting)
+    elif isinstance(obj, (set, frozenset)):
+        tag(f"set {len(obj)}")
+        for item in sorted(obj, key=repr):
+            _update(digest, item, visiting)
+    elif isinstance(obj, types.FunctionType):
+        _update_function(digest, obj, visiting)
+    elif isinstance(obj, types.ModuleType):
+        tag("module")
+        digest.update(obj.__name__.encode())
+    elif isinstance(obj, (type, types.BuiltinFunctionType)) and _is_library(obj.__module__):
+        # library code, its version is part of the grader version
+        tag("library")
+        digest.update(f"{obj.__module__}.{obj.__qualname__}".encode())
+    else:
+        raise Uncacheable(obj)
+
+
+def _update_function(digest, function, visiting: set):
+    """Code, defaults, closure and referenced globals of a function outside the libraries."""
+    if _is_library(function.__module__):
+        digest.update(f"\x00library\x00{function.__module__}.{function.__qualname__}".encode())
+        return
+    if id(function) in visiting:
+        # recursion, the function is already being hashed
+        digest.update(f"\x00recursive\x00{function.__qualname__}".encode())
+        return
+    visiting.add(id(function))
+
+    digest.update(b"\x00function\x00")
+    names = _update_code(digest, function.__code__)
+    _update(digest, function.__defaults__, visiting)
+    _update(digest, function.__kwdefaults__, visiting)
+    for cell in function.__closure__ or ():
+        _update(digest, cell.cell_contents, visiting)
+    for name in sorted(names):
+        if name in function.__globals__:
+            digest.update(name.encode())
+            _update(digest, function.__globals__[name], visiting)
+
+    visiting.discard(id(function))
+
+
+def _update_code(digest, code) -> set:
+    """Feeds a code object and its nested ones to digest; returns the names they use."""
+    digest.update(code.co_code)
+    digest.update(repr((code.co_argcount, code.co_kwonlyargcount, code.co_varnames, code.co_names)).encode())
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _update_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def _is_library(module_name: Optional[str]) -> bool:
+    """True for the modules of the standard library and of installed packages."""
+    module = sys.modules.get(module_name)
+    if module is None:
+        return False
+    path = getattr(module, "__file__", None)
+    if path is None:
+        return module_name in sys.builtin_module_names
+    return os.path.realpath(path).startswith(LIBRARY_PATHS)
+
+
+def _qpy_bytes(circuit: QuantumCircuit) -> bytes:
+    """QPY of the circuit without the parts that change between identical submissions.
+
+    The default name counts the circuits of the session, and the parameters get
+    fresh UUIDs each time they are created.
+    """
+    circuit = circuit.copy(name="circuit")
+    if circuit.parameters:
+        circuit.assign_parameters(
+            {
+                parameter: Parameter(parameter.name, uuid=uuid.UUID(int=j))
+                for j, parameter in enumerate(circuit.parameters)
+            },
+            inplace=True,
+        )
+    buffer = io.BytesIO()
+    qpy.dump(circuit, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+
+"""
+Batch runner of the checks of ECC2025.testing.
+
+A submission is a Python script or a Jupyter notebook defining the objects the
+checks take, with the names of their arguments (qc_ghz_op, folding, A, ...).
+Each submission is graded in a worker process with a time limit per check and
+a memory limit per worker, and the verdicts are written as JSON.
+
+Usage:
+    python -m ECC2025.grading submissions/*.ipynb --tests test_1a test_2c --output verdicts.json
+"""
+
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import re
+import resource
+import runpy
+import signal
+import tempfile
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+
+# the checks print a Spanish verdict, the last line printed decides the status
+PASSED = re.compile(r"felicidades|felicitaciones|\bcorrect[oa]s?\b", re.IGNORECASE)
+NEGATED = re.compile(r"\bno\b", re.IGNORECASE)
+
+# crashes of the worker after which a check is recorded as an error, a check that
+# crashed fewer times is retried (with 2, a crashed check gets one retry)
+MAX_CRASHES = 2
+
+# seconds past the time limit after which the worker is killed, SIGALRM cannot
+# interrupt a simulation stuck inside Aer or numpy
+KILL_GRACE = 30
+
+
+class GradingTimeout(BaseException):
+    """A BaseException, so that no except Exception of a check or submission swallows it."""
+
+
+def grade(
+        submissions: Iterable[str],
+        tests: Optional[Iterable[str]] = None,
+        timeout: float = 300,
+        memory_mb: Optional[int] = 4096,
+        workers: Optional[int] = None,
+        profile: bool = False,
+    ) -> list[dict]:
+    """Grades every submission in a pool of worker processes.
+
+    tests=None runs every check whose arguments the submission defines. Each
+    check gets timeout seconds, and each worker at most memory_mb MB of address
+    space. A worker still busy KILL_GRACE seconds after the time limit is
+    killed, and one that dies only costs the check it was running: the rest of
+    its submission goes on in a fresh worker. Returns one dict per submission,
+    in the given order, with the status ("passed", "failed", "error",
+    "timeout" or "missing") and printed output of each check, plus its
+    ECC2025.profiling record when profile is True.
+    """
+    submissions = list(submissions)
+    report_missing = tests is not None
+    tests = test_names() if tests is None else list(tests)
+    workers = workers or min(len(submissions), os.cpu_count() or 1) or 1
+
+    reports = {
+        submission: {"submission": submission, "error": None, "results": []}
+        for submission in submissions
+    }
+    crashes = {}
+    pending = deque((submission, tests) for submission in submissions)
+    idle = []
+    busy = []
+    try:
+        while pending or busy:
+            while pending and (idle or len(busy) < workers):
+                worker = idle.pop() if idle else _Worker(memory_mb, timeout, report_missing, profile)
+                worker.assign(*pending.popleft())
+                busy.append(worker)
+
+            deadline = min(worker.deadline for worker in busy)
+            waitables = [worker.connection for worker in busy] + [worker.process.sentinel for worker in busy]
+            multiprocessing.connection.wait(waitables, max(deadline - time.monotonic(), 0))
+
+            for worker in list(busy):
+                report = reports[worker.submission]
+                if worker.receive(report):
+                    busy.remove(worker)
+                    idle.append(worker)
+                elif not worker.process.is_alive():
+                    busy.remove(worker)
+                    retry = _crashed(worker, report, crashes)
+                    if retry is not None:
+                        pending.appendleft(retry)
+                elif time.monotonic() > worker.deadline:
+                    busy.remove(worker)
+                    worker.kill()
+                    retry = _timed_out(worker, report, timeout)
+                    if retry is not None:
+                        pending.appendleft(retry)
+    finally:
+        for worker in idle:
+            worker.close()
+        for worker in busy:
+            worker.kill()
+
+    return [reports[submission] for submission in submissions]
+
+
+class _Worker:
+    """A spawned process grading one submission at a time, reporting each check as it goes.
+
+    Workers are spawned, Aer does not survive a fork once it has run.
+    """
+
+    def __init__(self, memory_mb: Optional[int], timeout: float, report_missing: bool, profile: bool):
+        self.timeout = timeout
+        self.connection, child = multiprocessing.get_context("spawn").Pipe()
+        self.process = multiprocessing.get_context("spawn").Process(
+            target=_work, args=(child, memory_mb, timeout, report_missing, profile), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.submission = None
+        self.tests = []
+        self.test = None
+
+    def assign(self, submission: str, tests: list[str]):
+        self.submission = submission
+        self.tests = list(tests)
+        self.test = None
+        self._extend_deadline()
+        self.connection.send((submission, self.tests))
+
+    def receive(self, report: dict) -> bool:
+        """Adds the messages of the worker to report; True once the submission is graded."""
+        try:
+            while self.connection.poll():
+                kind, content = self.connection.recv()
+                self._extend_deadline()
+                if kind == "check":
+                    self.test = content
+                elif kind == "result":
+                    report["results"].append(content)
+                elif kind == "error":
+                    report["error"] = content
+                elif kind == "done":
+                    return True
+        except (EOFError, OSError):
+            # the worker died, the sentinel tells the rest
+            pass
+        return False
+
+    def remaining(self) -> list[str]:
+        """Checks after the one being run."""
+        if self.test is None:
+            return self.tests
+        return self.tests[self.tests.index(self.test) + 1:]
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.connection.close()
+
+    def _extend_deadline(self):
+        # the time limit of a check, or of loading the submission, counts from its start
+        self.deadline = time.monotonic() + self.timeout + KILL_GRACE
+
+
+def _crashed(worker: _Worker, report: dict, crashes: dict) -> Optional[tuple]:
+    """Records the death of worker, returns what is left to grade of its submission."""
+    worker.connection.close()
+    key = (worker.submission, worker.test)
+    crashes[key] = crashes.get(key, 0) + 1
+    if crashes[key] < MAX_CRASHES:
+        # the check, or the loading of the submission, is retried
+        return worker.submission, ([worker.test] if worker.test else []) + worker.remaining()
+
+    if worker.test is None:
+        report["error"] = "the worker process died"
+        return None
+    report["results"].append(
+        {"test": worker.test, "status": "error", "output": "the worker process died\n", "time": 0.0}
+    )
+    return (worker.submission, worker.remaining()) if worker.remaining() else None
+
+
+def _timed_out(worker: _Worker, report: dict, timeout: float) -> Optional[tuple]:
+    """Records the kill of worker, returns what is left to grade of its submission."""
+    if worker.test is None:
+        report["error"] = f"GradingTimeout: the submission ran more than {timeout} s"
+        return None
+    report["results"].append(
+        {
+            "test": worker.test,
+            "status": "timeout",
+            "output": f"killed after more than {timeout} s\n",
+            "time": timeout + KILL_GRACE,
+        }
+    )
+    return (worker.submission, worker.remaining()) if worker.remaining() else None
+
+
+def test_names() -> list[str]:
+    """Names of the checks of ECC2025.testing, in the order they are defined."""
+    from . import testing
+
+    functions = [
+        inspect.unwrap(function)
+        for name, function in inspect.getmembers(testing, inspect.isfunction)
+        if name.startswith("test_") and function.__module__ == testing.__name__
+    ]
+    return [function.__name__ for function in sorted(functions, key=lambda f: f.__code__.co_firstlineno)]
+
+
+def _work(connection, memory_mb: Optional[int], timeout: float, report_missing: bool, profile: bool):
+    """Main loop of a worker: grades the submissions the parent sends until it sends None."""
+    _init_worker(memory_mb)
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        submission, tests = task
+        for message in _grade_submission(submission, tests, timeout, report_missing, profile):
+            connection.send(message)
+        connection.send(("done", None))
+
+
+def _init_worker(memory_mb: Optional[int]):
+    if memory_mb is not None:
+        limit = memory_mb * 2**20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    # import the checks and run the shared sampler once, so every submission
+    # of this worker finds the backends warm
+    from qiskit import QuantumCircuit
+    from . import testing
+
+    circuit = QuantumCircuit(1, 1)
+    circuit.measure(0, 0)
+    testing.sampler.run(circuit).result()
+
+
+def _grade_submission(
+        submission: str,
+        tests: list[str],
+        timeout: float,
+        report_missing: bool = True,
+        profile: bool = False,
+    ):
+    """Grades submission, yielding the ("check", name), ("result", result) and ("error", text) messages for the parent."""
+    from . import testing
+    from .profiling import instrument
+
+    output = io.StringIO()
+    try:
+        with _time_limit(timeout), _without_checks(testing), contextlib.redirect_stdout(output):
+            namespace = _load_submission(submission)
+    except (Exception, SystemExit, GradingTimeout) as error:
+        yield "error", f"{type(error).__name__}: {error}"
+        return
+
+    with instrument() if profile else contextlib.nullcontext() as grading_profile:
+        for name in tests:
+            yield "check", name
+            test = getattr(testing, name)
+            arguments = _arguments(test, namespace)
+            if arguments is None:
+                if report_missing:
+                    yield "result", {"test": name, "status": "missing", "output": "", "time": 0.0}
+                continue
+            result = _run_test(test, arguments, timeout)
+            if profile and grading_profile.records:
+                result["profile"] = grading_profile.records.pop()
+            yield "result", result
+
+
+@contextlib.contextmanager
+def _without_checks(module):
+    """Turns the checks of module into no-ops, so the calls a notebook makes to them do not run twice."""
+    checks = {
+        name: value
+        for name, value in vars(module).items()
+        if name.startswith("test_") and callable(value)
+    }
+    try:
+        for name in checks:
+            setattr(module, name, _skipped_check)
+        yield
+    finally:
+        for name, value in checks.items():
+            setattr(module, name, value)
+
+
+def _skipped_check(*args, **kwargs):
+    pass
+
+
+def _load_submission(submission: str) -> dict:
+    """Global variables of the submission after running it."""
+    if not submission.endswith(".ipynb"):
+        return runpy.run_path(submission, run_name="__submission__")
+
+    with open(submission) as file:
+        notebook = json.load(file)
+    lines = []
+    for cell in notebook["cells"]:
+        if cell["cell_type"] != "code":
+            continue
+        source = cell["source"]
+        source = "".join(source) if isinstance(source, list) else source
+        for line in source.splitlines():
+            # magics and shell commands are not Python
+            if line.lstrip().startswith(("%", "!")):
+                line = ""
+            lines.append(line)
+
+    file_descriptor, path = tempfile.mkstemp(suffix=".py")
+    try:
+        with os.fdopen(file_descriptor, "w") as file:
+            file.write("\n".join(lines))
+        return runpy.run_path(path, run_name="__submission__")
+    finally:
+        os.remove(path)
+
+
+def _arguments(test, namespace: dict) -> Optional[dict]:
+    """Arguments of test taken from the submission, None if a required one is missing."""
+    arguments = {}
+    for name, parameter in inspect.signature(test).parameters.items():
+        if name in namespace:
+            arguments[name] = namespace[name]
+        elif parameter.default is inspect.Parameter.empty:
+            return None
+    return arguments
+
+
+def _run_test(test, arguments: dict, timeout: float) -> dict:
+    output = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with _time_limit(timeout), contextlib.redirect_stdout(output):
+            test(**arguments)
+        status = _status(output.getvalue())
+    except GradingTimeout:
+        status = "timeout"
+    except Exception as error:
+        status = "error"
+        output.write(f"{type(error).__name__}: {error}\n")
+
+    return {
+        "test": test.__name__,
+        "status": status,
+        "output": output.getvalue(),
+        "time": time.perf_counter() - start,
+    }
+
+
+def _status(output: str) -> str:
+    lines = [line for line in output.splitlines() if line.strip()]
+    if lines and PASSED.search(lines[-1]) and not NEGATED.search(lines[-1]):
+        return "passed"
+    return "failed"
+
+
+@contextlib.contextmanager
+def _time_limit(seconds: float):
+    def handler(signum, frame):
+        raise GradingTimeout(f"more than {seconds} s")
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grades submissions with the checks of ECC2025.testing.")
+    parser.add_argument("submissions", nargs="+", help="Python scripts or Jupyter notebooks")
+    parser.add_argument("--tests", nargs="+", default=None, help="checks to run, all by default")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds per check")
+    parser.add_argument("--memory-mb", type=int, default=4096, help="address space per worker")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--profile", action="store_true", help="time the phases of each check")
+    parser.add_argument("--output", default="verdicts.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = grade(
+        args.submissions, args.tests, args.timeout, args.memory_mb, args.workers, args.profile
+    )
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "wall_time": time.perf_counter() - start,
+                "submissions": reports,
+            },
+            file,
+            indent=2,
+        )
+
+    for report in reports:
+        statuses = ", ".join(f"{result['test']} {result['status']}" for result in report["results"])
+        print(f"{report['submission']}: {report['error'] or statuses}")
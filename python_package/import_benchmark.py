@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Import time and memory of ECC2025.testing, measured in fresh interpreters.
+
+Exits with status 1 when importing the checks loads one of LAZY_MODULES, or
+exceeds the given time or memory budget, so it can guard the lazy imports.
+
+Usage:
+    python -m ECC2025.import_benchmark --repeat 5 --max-seconds 3 --max-rss-mb 250
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+
+# libraries the checks load on first use, none of them on import
+LAZY_MODULES = (
+    "qiskit_aer",
+    "qiskit_ibm_runtime",
+    "qiskit_algorithms",
+    "sklearn",
+    "matplotlib",
+    "scipy.linalg",
+)
+
+# run in the fresh interpreter, prints its measurements as JSON
+MEASURE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start
+print(json.dumps({{
+    "import_time": import_time,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [name for name in {lazy_modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_import(module: str = "ECC2025.testing", repeat: int = 5) -> dict:
+    """Median import time and peak RSS of module over repeat fresh interpreters."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module, lazy_modules=LAZY_MODULES)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    return {
+        "module": module,
+        "repeat": repeat,
+        "import_time": statistics.median(run["import_time"] for run in runs),
+        "max_rss_mb": statistics.median(run["max_rss_mb"] for run in runs),
+        "loaded": sorted({name for run in runs for name in run["loaded"]}),
+    }
+
+
+def check(
+        result: dict, max_seconds: Optional[float] = None, max_rss_mb: Optional[float] = None
+    ) -> list[str]:
+    """Reasons why result breaks the budget, empty when it does not."""
+    failures = [f"{name} is imported eagerly" for name in result["loaded"]]
+    if max_seconds is not None and result["import_time"] > max_seconds:
+        failures.append(f"import takes {result['import_time']:.2f} s > {max_seconds} s")
+    if max_rss_mb is not None and result["max_rss_mb"] > max_rss_mb:
+        failures.append(f"import takes {result['max_rss_mb']:.0f} MB > {max_rss_mb} MB")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the import of ECC2025.testing.")
+    parser.add_argument("--module", default="ECC2025.testing")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    result = measure_import(args.module, args.repeat)
+    failures = check(result, args.max_seconds, args.max_rss_mb)
+    print(json.dumps(result))
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,184 @@
+"""
+Timing and memory instrumentation of the checks of ECC2025.testing.
+
+Usage:
+    from ECC2025 import testing
+    from ECC2025.profiling import instrument
+
+    with instrument() as profile:
+        testing.test_1b( qc_ghz_op )
+    profile.to_json( "profile.json" )
+"""
+
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+from qiskit.primitives.primitive_job import PrimitiveJob
+from qiskit_aer.jobs import AerJob
+
+
+# names of ECC2025.testing timed as a phase, with the phase they are counted in
+PHASES = {
+    "transpile": "transpile",
+    "Operator": "operator",
+    "expm": "expm",
+}
+
+# waiting for the result of a job is where the simulators spend their time
+JOB_RESULTS = (AerJob, PrimitiveJob)
+
+
+class GradingProfile:
+    """Wall time and peak memory of each check and of its phases.
+
+    Every call of a check adds a record with its wall time, the peak of the
+    Python allocations traced by tracemalloc, and the calls, wall time and peak
+    memory of each phase: "transpile", "operator" (building an Operator),
+    "expm" and "simulation" (waiting for a job of Aer or of a primitive).
+    Allocations made inside Aer itself are not traced.
+    """
+
+    def __init__(self, hook: Optional[Callable[[dict], None]] = None):
+        self.records = []
+        self.hook = hook
+        # [record, running peak] of the check and of the phases being timed
+        self._stack = []
+        self._thread = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Times the block as the phase name of the check being run.
+
+        Phases entered by other threads, such as the simulations a primitive
+        runs inside its job, are part of the phase waiting for that job.
+        """
+        if not self._stack or threading.get_ident() != self._thread:
+            yield
+            return
+
+        self._enter()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            peak = self._exit()
+            phase = self._stack[0][0]["phases"].setdefault(
+                name, {"calls": 0, "wall_time": 0.0, "peak_memory": 0}
+            )
+            phase["calls"] += 1
+            phase["wall_time"] += wall_time
+            phase["peak_memory"] = max(phase["peak_memory"], peak)
+
+    def check(self, test: Callable) -> Callable:
+        """Wraps test so that each call adds a record."""
+        @functools.wraps(test)
+        def wrapper(*args, **kwargs):
+            if self._stack:
+                return test(*args, **kwargs)
+
+            record = {"test": test.__name__, "wall_time": 0.0, "peak_memory": 0, "phases": {}}
+            self._stack.append([record, 0])
+            self._thread = threading.get_ident()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return test(*args, **kwargs)
+            finally:
+                record["wall_time"] = time.perf_counter() - start
+                record["peak_memory"] = max(self._stack.pop()[1], tracemalloc.get_traced_memory()[1])
+                self.records.append(record)
+                if self.hook is not None:
+                    self.hook(record)
+
+        return wrapper
+
+    def summary(self) -> dict:
+        """Totals of every check and phase over the records."""
+        tests = {}
+        for record in self.records:
+            total = tests.setdefault(
+                record["test"], {"calls": 0, "wall_time": 0.0, "peak_memory": 0, "phases": {}}
+            )
+            total["calls"] += 1
+            total["wall_time"] += record["wall_time"]
+            total["peak_memory"] = max(total["peak_memory"], record["peak_memory"])
+            for name, phase in record["phases"].items():
+                phase_total = total["phases"].setdefault(
+                    name, {"calls": 0, "wall_time": 0.0, "peak_memory": 0}
+                )
+                phase_total["calls"] += phase["calls"]
+                phase_total["wall_time"] += phase["wall_time"]
+                phase_total["peak_memory"] = max(phase_total["peak_memory"], phase["peak_memory"])
+        return tests
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps({"records": self.records, "summary": self.summary()}, indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    def _enter(self):
+        # the peak so far belongs to the enclosing phase, the new phase starts from scratch
+        self._stack[-1][1] = max(self._stack[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._stack.append([None, 0])
+
+    def _exit(self) -> int:
+        peak = max(self._stack.pop()[1], tracemalloc.get_traced_memory()[1])
+        self._stack[-1][1] = max(self._stack[-1][1], peak)
+        return peak
+
+
+@contextlib.contextmanager
+def instrument(hook: Optional[Callable[[dict], None]] = None, module=None):
+    """Profiles every check of ECC2025.testing called inside the block.
+
+    hook, if given, receives each record as soon as its check returns. The
+    checks and the timed names of the module are patched for the duration of
+    the block and restored afterwards.
+    """
+    if module is None:
+        from . import testing as module
+
+    profile = GradingProfile(hook)
+    patched = {}
+    for name, value in vars(module).items():
+        if name.startswith("test_") and callable(value):
+            patched[name] = profile.check(value)
+        elif name in PHASES:
+            patched[name] = _timed(profile, PHASES[name], value)
+
+    originals = {name: getattr(module, name) for name in patched}
+    results = {job: job.result for job in JOB_RESULTS}
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for name, value in patched.items():
+            setattr(module, name, value)
+        for job, result in results.items():
+            job.result = _timed(profile, "simulation", result)
+        yield profile
+    finally:
+        for name, value in originals.items():
+            setattr(module, name, value)
+        for job, result in results.items():
+            job.result = result
+        if not tracing:
+            tracemalloc.stop()
+
+
+def _timed(profile: GradingProfile, phase: str, function: Callable) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with profile.phase(phase):
+            return function(*args, **kwargs)
+
+    return wrapper
@@ -1,55 +1,295 @@
 import os
+import importlib
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt 
 from inspect import isfunction
 from qiskit import QuantumCircuit
 from qiskit import transpile  
 from qiskit.quantum_info import Statevector, Operator
 from qiskit.quantum_info import hellinger_distance
 from qiskit.quantum_info import SparsePauliOp, process_fidelity
-from scipy.linalg import expm
-from qiskit_ibm_runtime.fake_provider import FakeBurlingtonV2 as FakeDevice
-from qiskit_aer import AerSimulator
-from qiskit import transpile
+from qiskit.quantum_info import Clifford, StabilizerState
+from qiskit.exceptions import QiskitError
 from qiskit.circuit.random import random_circuit
-from qiskit_algorithms import VQE
-from qiskit_algorithms.optimizers import COBYLA
-from qiskit_aer.noise import NoiseModel, depolarizing_error
-from qiskit_aer.primitives import Estimator
-from qiskit.primitives import Estimator as Estimator_ideal
-from sklearn.svm import SVC 
-from sklearn.metrics import accuracy_score, confusion_matrix, ConfusionMatrixDisplay, classification_report
 from qiskit.transpiler.passes import RemoveBarriers
-from qiskit_ibm_runtime.fake_provider import FakeRochesterV2
-from qiskit_aer.primitives import Sampler
+from .cache import cached, canonical_hash, Uncacheable
+
+
+class _Lazy:
+    """
+    Stands for module.name, or for the module itself when name is None, and
+    imports it on first use, so each challenge only pays for the libraries it
+    needs. With instantiate=True it stands for an instance built without
+    arguments.
+    """
+
+    def __init__( self, module, name=None, instantiate=False ):
+        self._module = module
+        self._name = name
+        self._instantiate = instantiate
+        self._object = None
+
+    def _load( self ):
+        if self._object is None:
+            obj = importlib.import_module( self._module )
+            if self._name is not None:
+                obj = getattr( obj, self._name )
+            self._object = obj() if self._instantiate else obj
+        return self._object
+
+    def __call__( self, *args, **kwargs ):
+        return self._load()( *args, **kwargs )
+
+    def __getattr__( self, name ):
+        return getattr( self._load(), name )
+
+
+plt = _Lazy( 'matplotlib.pyplot' )
+expm = _Lazy( 'scipy.linalg', 'expm' )
+FakeDevice = _Lazy( 'qiskit_ibm_runtime.fake_provider', 'FakeBurlingtonV2' )
+FakeRochesterV2 = _Lazy( 'qiskit_ibm_runtime.fake_provider', 'FakeRochesterV2' )
+AerSimulator = _Lazy( 'qiskit_aer', 'AerSimulator' )
+VQE = _Lazy( 'qiskit_algorithms', 'VQE' )
+COBYLA = _Lazy( 'qiskit_algorithms.optimizers', 'COBYLA' )
+NoiseModel = _Lazy( 'qiskit_aer.noise', 'NoiseModel' )
+depolarizing_error = _Lazy( 'qiskit_aer.noise', 'depolarizing_error' )
+Estimator = _Lazy( 'qiskit_aer.primitives', 'Estimator' )
+Estimator_ideal = _Lazy( 'qiskit.primitives', 'Estimator' )
+SVC = _Lazy( 'sklearn.svm', 'SVC' )
+accuracy_score = _Lazy( 'sklearn.metrics', 'accuracy_score' )
+confusion_matrix = _Lazy( 'sklearn.metrics', 'confusion_matrix' )
+ConfusionMatrixDisplay = _Lazy( 'sklearn.metrics', 'ConfusionMatrixDisplay' )
+classification_report = _Lazy( 'sklearn.metrics', 'classification_report' )
+Sampler = _Lazy( 'qiskit_aer.primitives', 'Sampler' )
+
+sampler = _Lazy( 'qiskit_aer.primitives', 'Sampler', instantiate=True )
+
+
+class _Batch:
+    """
+    Collects the circuits (and observables) a test needs, submits them as a
+    single primitive job and returns the results in the order of add.
+    """
+
+    def __init__( self ):
+        self.circuits = []
+        self.observables = []
+
+    @classmethod
+    def of( cls, circuits, observable=None ):
+        batch = cls()
+        for circuit in circuits:
+            batch.add( circuit, observable )
+        return batch
+
+    def add( self, circuit, observable=None ):
+        self.circuits.append( circuit )
+        self.observables.append( observable )
+        return len(self.circuits) - 1
+
+    def quasi_dists( self, sampler ):
+        return sampler.run( self.circuits ).result().quasi_dists
+
+    def values( self, estimator ):
+        return estimator.run( self.circuits, self.observables ).result().values
+
+    def counts( self, backend ):
+        result = backend.run( self.circuits ).result()
+        return [ result.get_counts(j) for j in range(len(self.circuits)) ]
+
+
+# Backends, simulators and transpiled circuits shared by every call of the
+# checks, so a long-lived grading process builds each of them only once.
+
+TRANSPILE_CACHE_SIZE = 256
+_transpiled = OrderedDict()
+
+
+@lru_cache( maxsize=None )
+def _fake_backend( backend_class ):
+    return backend_class()
+
+
+@lru_cache( maxsize=None )
+def _noise_simulator( backend_class ):
+    return AerSimulator.from_backend( _fake_backend( backend_class ) )
+
+
+@lru_cache( maxsize=None )
+def _aer_simulator( method='automatic' ):
+    return AerSimulator( method=method )
+
+
+@lru_cache( maxsize=None )
+def _density_matrix_simulator( simulator_noise ):
+    return AerSimulator( method='density_matrix', noise_model=simulator_noise.options.noise_model )
+
+
+def _transpile_cached( circuit, backend=None, **options ):
+    """
+    transpile( circuit, backend, **options ) with a process-wide LRU cache keyed
+    by the hash of the circuit and of the options. Backends are keyed by
+    identity, pass the shared ones above. Returns a copy of the cached circuit.
+    """
+    try:
+        key = ( canonical_hash( (circuit, options) ), id(backend) )
+    except Uncacheable:
+        return transpile( circuit, backend, **options )
+
+    if key in _transpiled:
+        _transpiled.move_to_end( key )
+    else:
+        # the backend is kept alive so that its id is not reused
+        _transpiled[key] = ( transpile( circuit, backend, **options ), backend )
+        if len(_transpiled) > TRANSPILE_CACHE_SIZE:
+            _transpiled.popitem( last=False )
+    return _transpiled[key][0].copy()
+
+
+# circuits of at most this many qubits are compared through their full matrices
+EXACT_QUBITS = 2
+
+
+def _equivalent( qc, target, atol=1e-6, num_probes=4, exact_qubits=EXACT_QUBITS,
+                basis_phases=False, up_to_phase=True, seed=None ):
+    """
+    Whether the circuit qc implements target up to a global phase, exactly
+    when up_to_phase is False, or up to a phase on each computational basis
+    input when basis_phases is True. qc can also be anything Operator takes,
+    such as a matrix. target is a circuit, a matrix or a function mapping a
+    statevector to its image. Up to exact_qubits qubits the full matrices are
+    compared. Above, both act on num_probes random states, alternately
+    product and entangled, and each image must agree within atol in norm,
+    which takes O(2^n) memory instead of O(4^n). Two different unitaries
+    agree on a Haar random state with probability zero.
+    """
+    if not isinstance( qc, QuantumCircuit ):
+        qc = Operator( qc )
+    num_qubits = qc.num_qubits
+    if num_qubits is None:
+        return False
+    dim = 2**num_qubits
+
+    if num_qubits <= exact_qubits:
+        U = Operator( qc ).to_matrix()
+        T = _target_matrix( target, dim )
+        if T.shape != U.shape:
+            return False
+        if basis_phases:
+            return np.allclose( np.abs( T.conj().T @ U ), np.eye(dim), atol=atol )
+        if not up_to_phase:
+            return np.linalg.norm( U - T ) <= atol
+        return _close_up_to_phase( [U.ravel()], [T.ravel()], atol )
+
+    # a target of another size cannot act on the probes
+    if isinstance( target, QuantumCircuit ):
+        if target.num_qubits != num_qubits:
+            return False
+    elif not callable( target ) and np.shape( target ) != (dim, dim):
+        return False
+
+    rng = np.random.default_rng( seed )
+    probes = []
+    for k in range(num_probes):
+        if basis_phases:
+            psi = np.zeros( dim, dtype=complex )
+            psi[ rng.integers(dim) ] = 1
+        elif k % 2 == 0:
+            psi = np.ones( 1, dtype=complex )
+            for _ in range(num_qubits):
+                psi = np.kron( _random_state( 2, rng ), psi )
+        else:
+            psi = _random_state( dim, rng )
+        probes.append( psi )
+
+    # Statevector does not copy the array and evolve applies the global phase in place
+    images = [ Statevector( psi.copy() ).evolve( qc ).data for psi in probes ]
+    targets = [ _apply_target( target, psi ) for psi in probes ]
+    if any( np.shape(t) != (dim,) for t in targets ):
+        return False
+    if basis_phases:
+        return all( _close_up_to_phase( [u], [t], atol ) for u, t in zip( images, targets ) )
+    if not up_to_phase:
+        return all( np.linalg.norm( u - t ) <= atol for u, t in zip( images, targets ) )
+    return _close_up_to_phase( images, targets, atol )
+
+
+def _close_up_to_phase( images, targets, atol ):
+    """ Whether images[k] = e^{i phi} targets[k] within atol in norm, with one phase for all k. """
+    overlap = sum( np.vdot( t, u ) for u, t in zip( images, targets ) )
+    phase = overlap / np.abs(overlap) if np.abs(overlap) > 0 else 1
+    return all( np.linalg.norm( u - phase*t ) <= atol for u, t in zip( images, targets ) )
+
+
+def _random_state( dim, rng ):
+    psi = rng.normal( size=dim ) + 1j*rng.normal( size=dim )
+    return psi / np.linalg.norm( psi )
+
+
+def _apply_target( target, psi ):
+    if isinstance( target, QuantumCircuit ):
+        return Statevector( psi.copy() ).evolve( target ).data
+    if callable( target ):
+        return np.asarray( target( psi ) )
+    return np.asarray( target ) @ psi
+
+
+def _target_matrix( target, dim ):
+    if isinstance( target, QuantumCircuit ):
+        return Operator( target ).to_matrix()
+    if callable( target ):
+        return np.column_stack( [ _apply_target( target, e ) for e in np.eye( dim, dtype=complex ) ] )
+    return np.asarray( target )
+
+
+def _clifford( qc ):
+    """ Clifford tableau of qc, None if qc has a non-Clifford gate or a non-unitary instruction. """
+    try:
+        return Clifford( qc )
+    except QiskitError:
+        return None
+
+
+def _same_state( qc, qc_target ):
+    """
+    Whether qc and qc_target prepare the same state from |0...0>, up to a
+    global phase. Clifford circuits are compared through their stabilizer
+    tableaux, which grow polynomially with the number of qubits, any other
+    circuit through its statevector.
+    """
+    clifford = _clifford( qc )
+    clifford_target = _clifford( qc_target )
+    if clifford is not None and clifford_target is not None:
+        return StabilizerState( clifford ).equiv( StabilizerState( clifford_target ) )
+    # the tableaux cannot see the global phase, so it is ignored here too
+    return Statevector( qc ).equiv( Statevector( qc_target ) )
 
-sampler = Sampler()
 
 ### NO MODIFICAR ###
 
 def test_1a( qc_ghz_op : QuantumCircuit ):
 
-    qc_ghz_op = transpile( qc_ghz_op )
+    qc_ghz_op = _transpile_cached( qc_ghz_op )
     n_qubits = 4 
     qc_ghz = QuantumCircuit( n_qubits ) 
     qc_ghz.h(0)
     for j in range(n_qubits-1):
         qc_ghz.cx(j,j+1)
-    state = Statevector( qc_ghz )
-    state_op = Statevector( qc_ghz_op )
 
     if not isinstance( qc_ghz_op, QuantumCircuit ):
         print('No es un circuito cuántico')
     elif qc_ghz_op.num_qubits != n_qubits:
         print('El circuito no tiene 4 qubits')
-    elif not np.isclose( np.linalg.norm( state-state_op ), 0 ):
+    elif not _same_state( qc_ghz_op, qc_ghz ):
         print('El circuito no prepara un estado GHZ')
     elif not ( qc_ghz_op.depth() == 3  ):
         print('La profundidad del circuito es muy grande')
     else:
         print('Felicidades, tu solución es correcta!')
 
-def test_1b( qc_ghz_op ):
+@cached
+def test_1b( qc_ghz_op, exact=True ):
 
     n_qubits = 4 
     qc_ghz_device = QuantumCircuit( n_qubits ) 
@@ -62,39 +302,44 @@ def test_1b( qc_ghz_op ):
     qc_ghz_device.cx(2,1)
     qc_ghz_device.cx(1,3)
 
-    device_backend = FakeDevice() 
-    simulator_noise = AerSimulator.from_backend(device_backend) 
+    device_backend = _fake_backend( FakeDevice ) 
+    simulator_noise = _noise_simulator( FakeDevice ) 
     qc_ghz_device_measured = qc_ghz_device.copy() 
     qc_ghz_device_measured.measure_all() 
-    qc_ghz_device_measured =  transpile( qc_ghz_device_measured, 
+    qc_ghz_device_measured =  _transpile_cached( qc_ghz_device_measured, 
                                         device_backend, optimization_level=0 ) 
 
     counts_ideal = { '0000':500, '1111':500  }
 
     qc_ghz_op_measured = qc_ghz_op.copy() 
     qc_ghz_op_measured.measure_all() 
-    qc_ghz_op_measured =  transpile( qc_ghz_op_measured, device_backend, optimization_level=0 ) 
-
-    state = Statevector( qc_ghz_device )
-    state_op = Statevector( qc_ghz_op )
+    qc_ghz_op_measured =  _transpile_cached( qc_ghz_op_measured, device_backend, optimization_level=0 ) 
 
     if not isinstance( qc_ghz_op, QuantumCircuit ):
         print('No es un circuito cuántico')
     elif qc_ghz_op.num_qubits != n_qubits:
         print('El circuito no tiene 4 qubits')
-    elif not np.isclose( np.linalg.norm( state-state_op ), 0 ):
+    elif not _same_state( qc_ghz_op, qc_ghz_device ):
         print('El circuito no prepara un estado GHZ')
     elif not ( qc_ghz_op_measured.depth() == 5  ):
         print('La profundidad del circuito mapeado al circuito es muy grande')
     else:
-        error1 = 0
-        error2 = 0
-        for _ in range(100):
-            counts_op = simulator_noise.run( qc_ghz_op_measured ).result().get_counts() 
-            counts_device = simulator_noise.run( qc_ghz_device_measured ).result().get_counts() 
+        if exact:
+            # exact distances, one density-matrix simulation per circuit
+            probs_op = _noisy_probabilities( qc_ghz_op_measured, simulator_noise )
+            probs_device = _noisy_probabilities( qc_ghz_device_measured, simulator_noise )
+
+            error1 = hellinger_distance(counts_ideal, probs_device)
+            error2 = hellinger_distance(counts_ideal, probs_op)
+        else:
+            error1 = 0
+            error2 = 0
+            for _ in range(100):
+                counts_op = simulator_noise.run( qc_ghz_op_measured ).result().get_counts() 
+                counts_device = simulator_noise.run( qc_ghz_device_measured ).result().get_counts() 
 
-            error1 += hellinger_distance(counts_ideal, counts_device)
-            error2 += hellinger_distance(counts_ideal, counts_op)
+                error1 += hellinger_distance(counts_ideal, counts_device)
+                error2 += hellinger_distance(counts_ideal, counts_op)
 
         if error2 < error1:
             print( 'Felicidades, tu solución es correcta!' )
@@ -102,6 +347,60 @@ def test_1b( qc_ghz_op ):
             print( 'El error de tu circuito es mayor!')
 
 
+def _noisy_probabilities( qc_measured, simulator_noise ):
+    """
+    Exact output distribution of a transpiled circuit ending in measurements,
+    under the noise model of simulator_noise. The gates are simulated once as a
+    density matrix and the readout errors are applied to the probabilities.
+    Returns a dict with the same keys as get_counts.
+    """
+    # physical qubit measured into each clbit
+    measured = {}
+    for instruction in qc_measured.data:
+        if instruction.operation.name == 'measure':
+            clbit = qc_measured.find_bit( instruction.clbits[0] ).index
+            measured[clbit] = qc_measured.find_bit( instruction.qubits[0] ).index
+    qubits = [ measured[clbit] for clbit in sorted(measured) ]
+
+    qc = qc_measured.remove_final_measurements( inplace=False )
+    qc.save_probabilities( qubits )
+
+    readouts = _readout_matrices( simulator_noise.options.noise_model )
+    simulator = _density_matrix_simulator( simulator_noise )
+    probs = np.asarray( simulator.run( qc ).result().data()['probabilities'] )
+
+    # bit i of the index is the axis num_bits-1-i of the tensor
+    num_bits = len(qubits)
+    probs = probs.reshape( num_bits*[2] )
+    for i, qubit in enumerate(qubits):
+        readout = readouts.get( qubit, readouts.get( None ) )
+        if readout is not None:
+            axis = num_bits - 1 - i
+            probs = np.moveaxis( np.tensordot( probs, readout, axes=([axis], [0]) ), -1, axis )
+
+    return { format(index, '0{}b'.format(num_bits)): p for index, p in enumerate(probs.ravel()) }
+
+
+def _readout_matrices( noise_model ):
+    """
+    Readout error matrix of each qubit, read from the serialized noise model
+    rather than from its private attributes. The key None holds the error of
+    the qubits without one of their own.
+    """
+    readouts = {}
+    for error in noise_model.to_dict()['errors']:
+        if error['type'] != 'roerror':
+            continue
+        probabilities = np.asarray( error['probabilities'] )
+        if 'gate_qubits' not in error:
+            readouts[None] = probabilities
+        for qubits in error.get( 'gate_qubits', [] ):
+            if len(qubits) != 1:
+                raise ValueError( 'Correlated readout errors are not supported.' )
+            readouts[ qubits[0] ] = probabilities
+    return readouts
+
+
 # #####################################
 def test_2a( folding ):
     sol = True
@@ -114,8 +413,7 @@ def test_2a( folding ):
             else:
                 sol = False
                 break
-            if np.isclose(Operator( qc_U ).to_matrix(), 
-                            Operator( qc_U_N ).to_matrix()).all():
+            if _equivalent( qc_U_N, qc_U ):
                 pass
             else:
                 sol=False
@@ -139,7 +437,8 @@ def test_2b( A ):
     else:
         print('A tiene que ser un operador SparsePauliOp')
 
-def test_2c( extrapolation, A, Ns, folding ):
+@cached
+def test_2c( extrapolation, A, Ns, folding, exact=False ):
 
     qc_U_1 = QuantumCircuit(2)
     qc_U_1.h(0)
@@ -151,54 +450,113 @@ def test_2c( extrapolation, A, Ns, folding ):
     qc_U_2.cx(0,1)
     qc_U_2.sdg(1)
 
+    qcs_U = [qc_U_1, qc_U_2]
+
     sol = True
-    
-    for error in [0.1, 0.01, 0.001]:
 
-        noise_model = NoiseModel()
-        error = depolarizing_error( 0.01, 1 )
-        noise_model.add_quantum_error( error, ['x', 'h', 'u', 'y', 'z'], [0] )
-        noise_model.add_quantum_error( error, ['x', 'h', 'u', 'y', 'z'], [1] )
+    # the three error levels of this check, 0.1, 0.01 and 0.001, always built
+    # the same noise model with a depolarizing error of 0.01, so that level is
+    # evaluated once
+    error = 0.01
 
-        backend = Estimator( backend_options={'noise_model':noise_model},
-                            run_options={'shots':100000,
-                                        'seed':0 },
-                            skip_transpilation = True ) 
-        
-        backend2 = Estimator_ideal() 
+    folded = [ folding( qc_U, n ) for qc_U in qcs_U for n in Ns ]
+    obs_all = _noisy_expectation_values( folded, A, error, exact=exact )
+    obs_ideal_all = _deduplicated( qcs_U, 
+                        lambda qcs: _Batch.of( qcs, A ).values( _ideal_estimator() ) )
 
-        for qc_U in [qc_U_1, qc_U_2]:
-            
-            obs = []
-            for n in Ns:
-                qc_U_N = folding( qc_U, n )
-                job = backend.run( qc_U_N, A )
-                obs.append( job.result().values[0] )
+    for j, qc_U in enumerate(qcs_U):
 
-            obs_ideal = backend2.run( qc_U, A ).result().values[0]
+        obs = obs_all[ j*len(Ns):(j+1)*len(Ns) ]
+        obs_ideal = obs_ideal_all[j]
 
-            a, b = extrapolation( Ns, obs )
-            obs_fit = a * (2*np.array(Ns)+1) + b 
-            error_fit = np.sum( (np.array(obs)-obs_fit) )
+        a, b = extrapolation( Ns, obs )
+        obs_fit = a * (2*np.array(Ns)+1) + b 
+        error_fit = np.sum( (np.array(obs)-obs_fit) )
 
-            if error_fit>0.01:
-                print('Su solución está equivocada, intenta de nuevo.')
-                sol = False
-                break
-
-            # print( obs_ideal, b )
-            if np.abs( obs_ideal - b) < 0.09 :
-                pass
-            else:
-                print('Su solución está equivocada, intenta de nuevo.')
-                sol = False
-                break  
-        if not sol:
+        if error_fit>0.01:
+            print('Su solución está equivocada, intenta de nuevo.')
+            sol = False
             break
+
+        # print( obs_ideal, b )
+        if np.abs( obs_ideal - b) < 0.09 :
+            pass
+        else:
+            print('Su solución está equivocada, intenta de nuevo.')
+            sol = False
+            break  
             
     if sol:
         print('Tu solución esta correcta!')  
 
+
+@lru_cache( maxsize=None )
+def _depolarizing_noise_model( error ):
+    noise_model = NoiseModel()
+    depolarizing = depolarizing_error( error, 1 )
+    noise_model.add_quantum_error( depolarizing, ['x', 'h', 'u', 'y', 'z'], [0] )
+    noise_model.add_quantum_error( depolarizing, ['x', 'h', 'u', 'y', 'z'], [1] )
+    return noise_model
+
+
+@lru_cache( maxsize=None )
+def _noisy_estimator( error ):
+    return Estimator( backend_options={'noise_model':_depolarizing_noise_model( error )},
+                        run_options={'shots':100000,
+                                    'seed':0 },
+                        skip_transpilation = True ) 
+
+
+@lru_cache( maxsize=None )
+def _depolarizing_simulator( error ):
+    return AerSimulator( method='density_matrix', noise_model=_depolarizing_noise_model( error ) )
+
+
+@lru_cache( maxsize=None )
+def _ideal_estimator():
+    return Estimator_ideal()
+
+
+def _noisy_expectation_values( circuits, observable, error, exact=False ):
+    """
+    Expectation values of observable on circuits under the depolarizing noise
+    of test_2c, from a single job where identical circuits are simulated once.
+    With exact=True they come from a density-matrix simulation instead of
+    100000 shots per circuit.
+    """
+    if not exact:
+        return _deduplicated( circuits, 
+                    lambda qcs: _Batch.of( qcs, observable ).values( _noisy_estimator( error ) ) )
+
+    def evaluate( qcs ):
+        saved = []
+        for qc in qcs:
+            qc = qc.copy()
+            qc.save_expectation_value( observable, qc.qubits )
+            saved.append( qc )
+        result = _depolarizing_simulator( error ).run( saved ).result()
+        return [ np.real( result.data(j)['expectation_value'] ) for j in range(len(saved)) ]
+
+    return _deduplicated( circuits, evaluate )
+
+
+def _deduplicated( circuits, evaluate ):
+    """
+    evaluate( distinct ) for the distinct circuits among circuits, by
+    canonical hash, with the values mapped back to every circuit.
+    """
+    keys = []
+    distinct = {}
+    for qc in circuits:
+        try:
+            key = canonical_hash( qc )
+        except Uncacheable:
+            key = id( qc )
+        distinct.setdefault( key, qc )
+        keys.append( key )
+    values = dict( zip( distinct, evaluate( list( distinct.values() ) ) ) )
+    return [ values[key] for key in keys ]
+
 #####################################################
 
 def test_3a( Fourier ):
@@ -207,12 +565,13 @@ def test_3a( Fourier ):
     if not isfunction( Fourier ):
         print('Input no es una función')
     else:
-        for num_qubits in range(2,6):
+        # F_jk = exp(2 pi i jk/2^n)/sqrt(2^n), applied with an inverse FFT
+        F = lambda psi: np.sqrt( len(psi) ) * np.fft.ifft( psi )
 
-            F = np.exp( 2j*np.pi*np.outer( np.arange(2**num_qubits), np.arange(2**num_qubits) )/2**num_qubits  ) / np.sqrt(2**num_qubits)
+        for num_qubits in range(2,6):
 
             qc = Fourier( num_qubits )
-            if not np.isclose( np.linalg.norm( F-Operator(qc).to_matrix() ), 0 ) :
+            if not _equivalent( qc, F ) :
                 sol = False 
                 print( 'La función no implementa la transformada de Fourier para {} qubits'.format(num_qubits) )
                 break
@@ -227,8 +586,8 @@ def test_3b( U_to_n ):
     sol = False 
     for power in range(1,6):
         U1 = np.diag([1,1,1,np.exp(power*1j*2*np.pi*0.375)])
-        U2 = Operator( U_to_n(power) ).to_matrix() 
-        if not np.isclose( np.linalg.norm( U1-U2 ), 0 ) :
+        # the phase of U^n becomes relative once controlled in test_3c
+        if not _equivalent( U_to_n(power), U1, up_to_phase=False ) :
             sol = False 
             print( 'La función no implementa '+r'$U^n$'+' para potencia {}'.format(power) )
             break
@@ -239,15 +598,18 @@ def test_3b( U_to_n ):
         print('Felicidades, tu solución es correcta!')
 
 
+@cached
 def test_3c( QuantumPhaseEstimation ):
 
     sol = False
-    for num_qubits in range(3,6):
+    qubit_range = range(3,6)
+    batch = _Batch()
+    for num_qubits in qubit_range:
+        batch.add( QuantumPhaseEstimation(num_qubits) )
+    all_counts = batch.counts( _aer_simulator() )
+
+    for num_qubits, counts in zip( qubit_range, all_counts ):
         phi = 0.375 
-        qc = QuantumPhaseEstimation(num_qubits)
-        backend = AerSimulator()
-        job = backend.run( qc )
-        counts = job.result().get_counts()
         phi_hat = int( max(counts ), 2 ) / 2**num_qubits
         if not np.isclose( np.abs(phi_hat-phi), 0 ) :
             sol = False 
@@ -284,7 +646,7 @@ def test_4a( Aj, Bk ):
        for j, a in enumerate(Aj):
               if a.num_qubits > 1:
                      print('Los circuitos deben tener 1 qubit')
-              if np.isclose( np.linalg.norm( Operator(a).to_matrix() - A[j] ), 0 ):
+              if _equivalent( a, A[j] ):
                      pass
               else:
                      sol = False 
@@ -293,7 +655,7 @@ def test_4a( Aj, Bk ):
        for k, b in enumerate(Bk):
               if b.num_qubits > 1:
                      print('Los circuitos deben tener 1 qubit')
-              if np.isclose( np.linalg.norm( Operator(b).to_matrix() - B[k] ), 0 ):
+              if _equivalent( b, B[k] ):
                      pass
               else:
                      sol = False
@@ -391,7 +753,7 @@ def test_4b( qcs, alice_trits, bob_trits ):
         qc.remove_final_measurements()
         is_equal = False
         for ind, op in enumerate(Ops_2qb):
-            if np.allclose( np.abs(op.T.conj()@Operator(qc).to_matrix()) - np.eye(4) , 0):
+            if _equivalent( qc, op, basis_phases=True ):
                 is_equal = True
                 op_indices.append(ind)
         if not is_equal:
@@ -911,34 +1273,24 @@ def test_7c( Kq_train, y_train, Kq_test, y_test ):
     return None
 
 
+@cached
 def test_9a( qc_flip ):
 
-    qc_test = QuantumCircuit(5,3)
-    qc_test.ry(0,0)
-    qc_test.compose( qc_flip, qubits=[0,1,2,3,4],
-                    clbits=[0,1], inplace=True )
-    qc_test.measure( [0,1,2], [0,1,2] )
-    job = sampler.run( qc_test )
-    probs = job.result().quasi_dists[0]
-    bool0 = np.isclose( probs.get(0,0), 1, rtol=0.1 )
-
-    qc_test = QuantumCircuit(5,3)
-    qc_test.ry(np.pi/2,0)
-    qc_test.compose( qc_flip, qubits=[0,1,2,3,4],
-                    clbits=[0,1], inplace=True )
-    qc_test.measure( [0,1,2], [0,1,2] )
-    job = sampler.run( qc_test )
-    probs = job.result().quasi_dists[0]
-    bool1 = np.isclose( probs.get(0,0), .5, rtol=0.1 ) and np.isclose( probs.get(7,0), .5, rtol=0.1 )
-
-    qc_test = QuantumCircuit(5,3)
-    qc_test.ry( np.pi, 0 )
-    qc_test.compose( qc_flip, qubits=[0,1,2,3,4],
-                    clbits=[0,1], inplace=True )
-    qc_test.measure( [0,1,2], [0,1,2] )
-    job = sampler.run( qc_test )
-    probs = job.result().quasi_dists[0]
-    bool2 = np.isclose( probs.get(7,0), 1, rtol=0.1 )
+    batch = _Batch()
+    # ry(0), ry(pi/2) and ry(pi) on |0>, prepared with Clifford gates so that
+    # Aer samples a Clifford qc_flip with its stabilizer method
+    for prepare in [ QuantumCircuit.id, QuantumCircuit.h, QuantumCircuit.x ]:
+        qc_test = QuantumCircuit(5,3)
+        prepare( qc_test, 0 )
+        qc_test.compose( qc_flip, qubits=[0,1,2,3,4],
+                        clbits=[0,1], inplace=True )
+        qc_test.measure( [0,1,2], [0,1,2] )
+        batch.add( qc_test )
+    probs0, probs1, probs2 = batch.quasi_dists( sampler )
+
+    bool0 = np.isclose( probs0.get(0,0), 1, rtol=0.1 )
+    bool1 = np.isclose( probs1.get(0,0), .5, rtol=0.1 ) and np.isclose( probs1.get(7,0), .5, rtol=0.1 )
+    bool2 = np.isclose( probs2.get(7,0), 1, rtol=0.1 )
 
     if bool0 and bool1 and bool2:
         print( 'Felicidades, tu código corrige amplitud')
@@ -946,16 +1298,17 @@ def test_9a( qc_flip ):
         print( 'Tu código esta no corrige los errores')
 
 
+@cached
 def test_9c(shor_code, layout ):
-    real_backend = FakeRochesterV2()
-    aer = AerSimulator()
+    real_backend = _fake_backend( FakeRochesterV2 )
+    aer = _aer_simulator()
     coupling_map = list( real_backend.coupling_map )
     basis_gates = [ 'h', 'u', 'cx', 'swap' ]
 
     def count_gates( shor_code, layout ):
         qc_shor = shor_code()
         qc_shor = RemoveBarriers()(qc_shor)
-        qc_transpiled = transpile( qc_shor, aer, basis_gates=basis_gates,
+        qc_transpiled = _transpile_cached( qc_shor, aer, basis_gates=basis_gates,
                                 coupling_map=real_backend.coupling_map,
                                 optimization_level=0 , seed_transpiler=0,
                                 initial_layout=layout )
@@ -0,0 +1,298 @@
+"""
+Zero-noise extrapolation with global and gate-level folding.
+
+The noise of a circuit is scaled by folding its gates, G -> G (G^dagger G)^k,
+the expectation values of every scaled circuit are estimated in a single
+Estimator job, and their trend is extrapolated to zero noise.
+
+Usage:
+    from qiskit_aer.primitives import Estimator
+    from ECC2025.zne import zne
+
+    estimator = Estimator( backend_options={'noise_model': noise_model}, skip_transpilation=True )
+    result = zne( qc, observable, estimator, scale_factors=(1, 1.5, 2, 3),
+                  folding="gates", extrapolation="exponential" )
+    result["value"]
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import Gate
+from qiskit.primitives import BaseEstimatorV2
+
+
+FOLDINGS = ("global", "gates")
+EXTRAPOLATIONS = ("richardson", "linear", "polynomial", "exponential")
+
+
+def fold_global(circuit: QuantumCircuit, scale_factor: float) -> QuantumCircuit:
+    """Folds the whole circuit, U -> U (U^dagger U)^k, then its last gates for the remainder.
+
+    Each fold adds two gates, so with d gates the result has the count d + 2k
+    closest to d * scale_factor. Scale factors between odd integers are
+    reached by folding only the end of the circuit. fold_global(qc, 2N + 1)
+    is the folding(qc, N) of Desafío 2. Measurements are only allowed at the
+    end, and are kept there.
+    """
+    _check_scale_factor(scale_factor)
+    body, measurements = _split_final_measurements(circuit)
+    num_gates = _num_gates(body)
+    num_folds, rest = divmod(round(num_gates * (scale_factor - 1) / 2), num_gates) if num_gates else (0, 0)
+
+    folded = body.copy()
+    inverse = body.inverse()
+    for _ in range(num_folds):
+        folded.compose(inverse, inplace=True)
+        folded.compose(body, inplace=True)
+    if rest:
+        tail = _last_gates(body, rest)
+        folded.compose(tail.inverse(), inplace=True)
+        folded.compose(tail, inplace=True)
+
+    for instruction in measurements:
+        folded.append(instruction)
+    return folded
+
+
+def fold_gates(
+        circuit: QuantumCircuit,
+        scale_factor: float,
+        order: str = "left",
+        seed: Optional[int] = None,
+    ) -> QuantumCircuit:
+    """Folds single gates, G -> G (G^dagger G)^k, up to the count d + 2k closest to d * scale_factor.
+
+    Every gate is folded (scale_factor - 1) // 2 times, and the remaining
+    folds go to the first gates (order="left"), the last ones ("right") or
+    gates drawn at random ("random"). Measurements, resets, barriers and
+    classically controlled operations are copied unfolded.
+    """
+    _check_scale_factor(scale_factor)
+    positions = [j for j, instruction in enumerate(circuit.data) if _is_gate(instruction)]
+    num_gates = len(positions)
+    num_folds, rest = divmod(round(num_gates * (scale_factor - 1) / 2), num_gates) if num_gates else (0, 0)
+
+    if order == "left":
+        extra = positions[:rest]
+    elif order == "right":
+        extra = positions[num_gates - rest:]
+    elif order == "random":
+        extra = np.random.default_rng(seed).choice(positions, size=rest, replace=False).tolist()
+    else:
+        raise ValueError(f"order must be 'left', 'right' or 'random', not {order!r}")
+    extra = set(extra)
+
+    folded = circuit.copy_empty_like()
+    for j, instruction in enumerate(circuit.data):
+        folded.append(instruction)
+        if not _is_gate(instruction):
+            continue
+        inverse = instruction.replace(operation=instruction.operation.inverse())
+        for _ in range(num_folds + (j in extra)):
+            folded.append(inverse)
+            folded.append(instruction)
+    return folded
+
+
+def richardson_extrapolate(scale_factors: Sequence[float], values: Sequence[float]) -> float:
+    """Value at zero noise of the polynomial through every point (Lagrange interpolation)."""
+    scale_factors = np.asarray(scale_factors, dtype=float)
+    if len(set(scale_factors)) != len(scale_factors):
+        raise ValueError("Richardson extrapolation needs distinct scale factors")
+    value = 0.0
+    for j, (scale_factor, point) in enumerate(zip(scale_factors, values)):
+        others = np.delete(scale_factors, j)
+        value += point * np.prod(others / (others - scale_factor))
+    return float(value)
+
+
+def polynomial_extrapolate(
+        scale_factors: Sequence[float], values: Sequence[float], order: int = 1
+    ) -> float:
+    """Value at zero noise of the least-squares polynomial of the given order."""
+    if order >= len(scale_factors):
+        raise ValueError(f"a polynomial of order {order} needs more than {order} scale factors")
+    return float(np.polyfit(scale_factors, values, order)[-1])
+
+
+def exponential_extrapolate(
+        scale_factors: Sequence[float], values: Sequence[float], asymptote: Optional[float] = None
+    ) -> float:
+    """Value at zero noise of a + b exp(-c scale_factor).
+
+    With a known asymptote, e.g. 0 for a Pauli observable under depolarizing
+    noise, the fit is linear in log|value - asymptote|; otherwise the three
+    parameters are fitted, which needs at least three scale factors.
+    """
+    scale_factors = np.asarray(scale_factors, dtype=float)
+    values = np.asarray(values, dtype=float)
+
+    if asymptote is not None:
+        shifted = values - asymptote
+        sign = np.sign(np.sum(shifted)) or 1.0
+        slope, intercept = np.polyfit(scale_factors, np.log(np.maximum(sign * shifted, 1e-12)), 1)
+        return float(asymptote + sign * np.exp(intercept))
+
+    if len(scale_factors) < 3:
+        raise ValueError("an exponential fit without asymptote needs at least three scale factors")
+    from scipy.optimize import curve_fit
+
+    def model(x, a, b, c):
+        return a + b * np.exp(-c * x)
+
+    guess = (values[-1], values[0] - values[-1], 1 / (np.ptp(scale_factors) or 1))
+    (a, b, _), _ = curve_fit(model, scale_factors, values, p0=guess, maxfev=10000)
+    return float(a + b)
+
+
+def extrapolate(
+        scale_factors: Sequence[float],
+        values: Sequence[float],
+        method: str = "richardson",
+        order: int = 2,
+        asymptote: Optional[float] = None,
+    ) -> float:
+    """Value at zero noise with one of EXTRAPOLATIONS; order is that of the polynomial fit."""
+    if method == "richardson":
+        return richardson_extrapolate(scale_factors, values)
+    if method == "linear":
+        return polynomial_extrapolate(scale_factors, values, 1)
+    if method == "polynomial":
+        return polynomial_extrapolate(scale_factors, values, order)
+    if method == "exponential":
+        return exponential_extrapolate(scale_factors, values, asymptote)
+    raise ValueError(f"method must be one of {EXTRAPOLATIONS}, not {method!r}")
+
+
+def zne(circuit: QuantumCircuit, observable, estimator, **options) -> dict:
+    """Zero-noise extrapolation of one expectation value, see zne_batch."""
+    return zne_batch([circuit], [observable], estimator, **options)[0]
+
+
+def zne_batch(
+        circuits: Sequence[QuantumCircuit],
+        observables: Sequence,
+        estimator,
+        scale_factors: Sequence[float] = (1, 3, 5),
+        folding: str = "global",
+        extrapolation: str = "richardson",
+        order: int = 2,
+        asymptote: Optional[float] = None,
+        fold_order: str = "random",
+        seed: Optional[int] = None,
+    ) -> list[dict]:
+    """Zero-noise extrapolation of the expectation value of each observable on its circuit.
+
+    Every circuit is folded to every scale factor with fold_global
+    (folding="global") or fold_gates (folding="gates", choosing the extra
+    gates by fold_order), and all the folded circuits go to the estimator,
+    V1 or V2, in a single job. The estimator must run the circuits as given:
+    a transpiler pass would cancel the folds, so an Aer Estimator V1 needs
+    skip_transpilation=True, as in test_2c.
+
+    Each result holds the extrapolated "value", the "values" at each scale
+    factor, and the "scale_factors" actually reached, the ratio of gate
+    counts after rounding, which are the ones extrapolated. Scale factors
+    too close for the gate count of a circuit, which would reach the same
+    factor twice, raise a ValueError before anything is run.
+    """
+    if folding not in FOLDINGS:
+        raise ValueError(f"folding must be one of {FOLDINGS}, not {folding!r}")
+    if len(circuits) != len(observables):
+        raise ValueError("there must be one observable per circuit")
+
+    folded = []
+    reached = []
+    for circuit in circuits:
+        num_gates = _num_gates(circuit)
+        factors = []
+        for scale_factor in scale_factors:
+            if folding == "global":
+                scaled = fold_global(circuit, scale_factor)
+            else:
+                scaled = fold_gates(circuit, scale_factor, order=fold_order, seed=seed)
+            folded.append(scaled)
+            factors.append(_num_gates(scaled) / num_gates if num_gates else 1.0)
+        _check_distinct(scale_factors, factors, num_gates)
+        reached.append(factors)
+
+    repeated = [observable for observable in observables for _ in scale_factors]
+    values = _estimate(estimator, folded, repeated)
+
+    results = []
+    for j, factors in enumerate(reached):
+        points = values[j * len(scale_factors):(j + 1) * len(scale_factors)]
+        results.append(
+            {
+                "value": extrapolate(factors, points, extrapolation, order, asymptote),
+                "values": list(points),
+                "scale_factors": factors,
+            }
+        )
+    return results
+
+
+def _estimate(estimator, circuits: list, observables: list) -> np.ndarray:
+    """Expectation values of a single job of a V1 or V2 estimator."""
+    if isinstance(estimator, BaseEstimatorV2):
+        result = estimator.run(list(zip(circuits, observables))).result()
+        return np.array([float(pub_result.data.evs) for pub_result in result])
+    return np.asarray(estimator.run(circuits, observables).result().values)
+
+
+def _check_scale_factor(scale_factor: float):
+    if scale_factor < 1:
+        raise ValueError(f"scale factors must be at least 1, not {scale_factor}")
+
+
+def _check_distinct(scale_factors: Sequence[float], reached: list[float], num_gates: int):
+    """Raises if two scale factors round to the same number of gates."""
+    seen = {}
+    for scale_factor, factor in zip(scale_factors, reached):
+        if factor in seen:
+            raise ValueError(
+                f"scale factors {seen[factor]} and {scale_factor} both reach {factor:g} "
+                f"on a circuit of {num_gates} gates, choose factors further apart"
+            )
+        seen[factor] = scale_factor
+
+
+def _is_gate(instruction) -> bool:
+    """Unitary gates, the only instructions that are folded."""
+    operation = instruction.operation
+    # read without the deprecation warning of Instruction.condition, gone in qiskit 2
+    return isinstance(operation, Gate) and getattr(operation, "_condition", None) is None
+
+
+def _num_gates(circuit: QuantumCircuit) -> int:
+    return sum(_is_gate(instruction) for instruction in circuit.data)
+
+
+def _split_final_measurements(circuit: QuantumCircuit) -> tuple[QuantumCircuit, list]:
+    """The circuit without its final measurements, and those measurements."""
+    last_gate = max(
+        (j for j, instruction in enumerate(circuit.data) if _is_gate(instruction)), default=-1
+    )
+    body = circuit.copy_empty_like()
+    measurements = []
+    for j, instruction in enumerate(circuit.data):
+        name = instruction.operation.name
+        if j > last_gate and name in ("measure", "barrier"):
+            measurements.append(instruction)
+        elif _is_gate(instruction) or name == "barrier":
+            body.append(instruction)
+        else:
+            raise ValueError(f"global folding cannot fold a circuit with a mid-circuit {name}")
+    return body, measurements
+
+
+def _last_gates(circuit: QuantumCircuit, num_gates: int) -> QuantumCircuit:
+    """The last num_gates gates of the circuit, with the barriers between them."""
+    positions = [j for j, instruction in enumerate(circuit.data) if _is_gate(instruction)]
+    tail = circuit.copy_empty_like()
+    tail.global_phase = 0
+    for instruction in circuit.data[positions[-num_gates]:]:
+        tail.append(instruction)
+    return tail
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of the Shor circuit generator.
+
+Usage:
+    python taller_2_shor_benchmark.py --N 15 21 --num-bases 2 --output shor_benchmark.json
+"""
+
+import argparse
+import cProfile
+import json
+import math
+import platform
+import pstats
+import time
+import tracemalloc
+from typing import Iterable, Optional
+
+import qiskit
+import qiskit_aer
+from qiskit import transpile
+from qiskit_aer import AerSimulator
+
+import taller_2_shor_generico as shor
+
+
+# functions of the construction whose cumulative time is reported
+HOT_PATHS = (
+    "_get_angles_batch", "assign_parameters", "_cc_phi_add_gate", "to_instruction"
+)
+
+
+def benchmark_shor(
+        N: int,
+        a: int,
+        basis_gates: Iterable[str] = ("u", "cx"),
+        shots: Optional[int] = 128,
+        approximation_degree: int = 0,
+        flat: bool = False,
+    ) -> dict:
+    """Measures the construction, transpilation and simulation of shor_circuit(N, a).
+
+    Every build starts from an empty building-block cache. shots=None skips the
+    Aer simulation.
+    """
+    def build():
+        return shor.shor_circuit(N, a, approximation_degree=approximation_degree, flat=flat)
+
+    result = {"N": N, "a": a}
+
+    shor.shor_cache_clear()
+    start = time.perf_counter()
+    circuit = build()
+    result["build_time"] = time.perf_counter() - start
+    result["num_qubits"] = circuit.num_qubits
+
+    shor.shor_cache_clear()
+    tracemalloc.start()
+    build()
+    result["build_peak_memory"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    shor.shor_cache_clear()
+    profiler = cProfile.Profile()
+    profiler.runcall(build)
+    result["hot_paths"] = _hot_paths(pstats.Stats(profiler))
+
+    # a second build for the same (N, a) is served by the cache
+    start = time.perf_counter()
+    build()
+    result["cached_build_time"] = time.perf_counter() - start
+
+    result["built"] = {"count_ops": dict(circuit.count_ops()), "depth": circuit.depth()}
+
+    start = time.perf_counter()
+    decomposed = transpile(circuit, basis_gates=list(basis_gates), optimization_level=0)
+    result["decompose_time"] = time.perf_counter() - start
+    result["decomposed"] = {"count_ops": dict(decomposed.count_ops()), "depth": decomposed.depth()}
+
+    simulator = AerSimulator()
+    start = time.perf_counter()
+    transpiled = transpile(circuit, simulator)
+    result["transpile_time"] = time.perf_counter() - start
+
+    if shots is not None:
+        start = time.perf_counter()
+        simulator.run(transpiled, shots=shots, seed_simulator=0).result()
+        result["simulation_time"] = time.perf_counter() - start
+
+    return result
+
+
+def run_benchmarks(
+        Ns: Iterable[int], num_bases: int = 2, **options
+    ) -> dict:
+    """Benchmarks the first num_bases coprime bases of each N."""
+    runs = []
+    for N in Ns:
+        bases = [a for a in range(2, N - 1) if math.gcd(a, N) == 1][:num_bases]
+        for a in bases:
+            runs.append(benchmark_shor(N, a, **options))
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "qiskit": qiskit.__version__,
+        "qiskit_aer": qiskit_aer.__version__,
+        "machine": platform.machine(),
+        "runs": runs,
+    }
+
+
+def _hot_paths(stats: pstats.Stats) -> dict:
+    """Calls and cumulative time of the HOT_PATHS functions, summed over their definitions."""
+    hot_paths = {name: {"calls": 0, "cumulative_time": 0.0} for name in HOT_PATHS}
+    for (_, _, name), (_, num_calls, _, cumulative_time, _) in stats.stats.items():
+        if name in hot_paths:
+            hot_paths[name]["calls"] += num_calls
+            hot_paths[name]["cumulative_time"] += cumulative_time
+    return hot_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks shor_circuit.")
+    parser.add_argument("--N", type=int, nargs="+", default=[15, 21])
+    parser.add_argument("--num-bases", type=int, default=2)
+    parser.add_argument("--shots", type=int, default=128)
+    parser.add_argument("--no-simulation", action="store_true")
+    parser.add_argument("--approximation-degree", type=int, default=0)
+    parser.add_argument("--flat", action="store_true", help="build with the flat builder")
+    parser.add_argument("--basis-gates", default="u,cx")
+    parser.add_argument("--output", default="shor_benchmark.json")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.N,
+        num_bases=args.num_bases,
+        basis_gates=args.basis_gates.split(","),
+        shots=None if args.no_simulation else args.shots,
+        approximation_degree=args.approximation_degree,
+        flat=args.flat,
+    )
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for run in results["runs"]:
+        print(
+            f"N={run['N']} a={run['a']}: build {run['build_time']:.3f} s, "
+            f"transpile {run['transpile_time']:.3f} s, "
+            f"cx {run['decomposed']['count_ops'].get('cx', 0)}"
+        )
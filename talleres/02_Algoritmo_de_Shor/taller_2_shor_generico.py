@@ -4,17 +4,198 @@
 Based upon Shor routine from qiskit 0.44
 """
 
+import math
+import multiprocessing
+import os
+import re
+import time
 import numpy as np
-from typing import Union
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Hashable, Iterable, Iterator, Optional, Union
 
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
-from qiskit.circuit import Instruction, Gate, ParameterVector
-from qiskit.circuit.library import QFT
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
+from qiskit.circuit import Instruction, Gate, ParameterVector, Qubit
+from qiskit.circuit.library import (
+    QFT, HGate, XGate, CXGate, SwapGate, CSwapGate, PhaseGate, CPhaseGate, MCXGate
+)
+from qiskit_aer import AerSimulator
 
 
-def shor_circuit(N: int, a: int, measurement=True) -> QuantumCircuit:
+class _LRUCache:
+    """Bounded least-recently-used cache for the Shor circuit building blocks."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key: Hashable, build: Callable):
+        """Returns the entry stored under key, building it on a miss."""
+        if key in self._data:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+        self.misses += 1
+        value = build()
+        self._data[key] = value
+        self._evict()
+        return value
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int):
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+# Gates that only depend on (n, N), or on (n, N, a), are shared between calls
+_cache = _LRUCache(maxsize=128)
+
+# chain order of the registers for matrix product state simulation; the
+# adders' register sitting between the controls and the target was the fastest
+MPS_REGISTER_ORDER = ("up", "ctrl", "aux", "down")
+
+# a measured j/r with gcd(j, r) > 1 gives a divisor of r, the order is looked
+# for among the first multiples of each continued-fraction denominator
+_ORDER_MULTIPLES = 4
+
+
+def shor_cache_info() -> dict:
+    """Hit/miss/eviction statistics of the building-block cache."""
+    return _cache.info()
+
+
+def shor_cache_clear():
+    """Empties the building-block cache and resets its statistics."""
+    _cache.clear()
+
+
+def shor_cache_resize(maxsize: int):
+    """Changes the maximum number of cached building blocks."""
+    _cache.resize(maxsize)
+
+
+def shor_circuit(
+        N: int, a: int, measurement=True, semiclassical=False, approximation_degree: int = 0,
+        flat: bool = False, window: Optional[int] = None,
+    ) -> QuantumCircuit:
+    """Shor circuit for the order of a mod N, read from the m register.
+
+    approximation_degree follows qiskit's QFT: with degree d, the controlled
+    rotations of the QFTs and the terms of the Fourier-adder angles that are
+    smaller than pi / 2^(num_qubits - 1 - d) are dropped, num_qubits being the
+    size of the register they act on.
+
+    flat=True writes the same gates straight into the returned circuit, without
+    the cached nested instructions, which saves memory and time for large N.
+
+    window=w exponentiates w bits of the up register per multiplication, looking
+    the constant a^(e 2^i) mod N of the window value e up into n extra qubits.
+    It needs n + 1 more qubits and is always built flat.
+    """
     n = N.bit_length()          # num qubits
 
+    if window is not None:
+        if semiclassical:
+            raise ValueError("The windowed exponentiation needs the whole up register.")
+        if window < 1:
+            raise ValueError(f"window={window} must be a positive number of bits.")
+        return _windowed_shor_circuit(n, N, a, window, measurement, approximation_degree)
+
+    if semiclassical:
+        if not measurement:
+            raise ValueError("The semiclassical circuit measures its control qubit mid-circuit.")
+        return _semiclassical_shor_circuit(n, N, a, approximation_degree, flat)
+
+    if flat:
+        return _flat_shor_circuit(n, N, a, measurement, approximation_degree)
+
+    modulo_power = _cache.get(
+        ("power_mod", n, N, a, approximation_degree),
+        lambda: _power_mod_N(n, N, a, approximation_degree=approximation_degree),
+    )
+
+    return _phase_estimation_circuit(
+        n, modulo_power, measurement, name=f"Shor(N={N}, a={a})",
+        approximation_degree=approximation_degree,
+    )
+
+
+def shor_template(
+        N: int, measurement=True, approximation_degree: int = 0, **transpile_options
+    ) -> QuantumCircuit:
+    """Shor circuit for N whose Fourier-adder angles are the parameters theta.
+
+    The structure of shor_circuit(N, a) does not depend on a, so the template can
+    be built (and transpiled, when transpile_options are given) once and then
+    bound to each base with bind_shor_template.
+    """
+    n = N.bit_length()
+
+    theta = ParameterVector("theta", length=2 * n * n * (n + 1))
+    angle_tables = np.array(list(theta), dtype=object).reshape(n, 2, n, n + 1)
+    multipliers = [
+        _controlled_multiple_mod_N(
+            n, N, None, *_modulo_N_gates(n, N, approximation_degree),
+            angles=angle_tables[i], approximation_degree=approximation_degree,
+        )
+        for i in range(n)
+    ]
+    modulo_power = _power_mod_N(n, N, None, multipliers=multipliers)
+
+    circuit = _phase_estimation_circuit(
+        n, modulo_power, measurement, name=f"Shor(N={N})",
+        approximation_degree=approximation_degree,
+    )
+    if transpile_options:
+        circuit = transpile(circuit, **transpile_options)
+    return circuit
+
+
+def shor_template_values(N: int, a: int, approximation_degree: int = 0) -> np.ndarray:
+    """Values of theta that turn shor_template(N) into shor_circuit(N, a)."""
+    n = N.bit_length()
+    partial_as = [pow(a, pow(2, i), N) for i in range(n)]
+    return _power_mod_angles(n, N, partial_as, approximation_degree).ravel()
+
+
+def bind_shor_template(
+        template: QuantumCircuit, N: int, a: int, approximation_degree: int = 0
+    ) -> QuantumCircuit:
+    """Binds a (possibly transpiled) shor_template to the base a."""
+    values = shor_template_values(N, a, approximation_degree)
+    bound = template.assign_parameters(
+        {param: values[param.index] for param in template.parameters if param.vector.name == "theta"}
+    )
+    bound.name = f"Shor(N={N}, a={a})"
+    return bound
+
+
+def _phase_estimation_circuit(
+        n: int, modulo_power: Instruction, measurement: bool, name: str,
+        approximation_degree: int = 0,
+    ) -> QuantumCircuit:
+    """Wraps the modular exponentiation between the up-register superposition and its inverse QFT."""
     # quantum register where the sequential QFT is performed
     up_qreg = QuantumRegister(n, name="up")
     # quantum register where the multiplications are made
@@ -23,7 +204,7 @@ def shor_circuit(N: int, a: int, measurement=True) -> QuantumCircuit:
     aux_qreg = QuantumRegister(n + 2, name="aux")
 
     # Create Quantum Circuit
-    circuit = QuantumCircuit(up_qreg, down_qreg, aux_qreg, name=f"Shor(N={N}, a={a})")
+    circuit = QuantumCircuit(up_qreg, down_qreg, aux_qreg, name=name)
 
     # Create maximal superposition in top register
     circuit.h(up_qreg)
@@ -32,11 +213,13 @@ def shor_circuit(N: int, a: int, measurement=True) -> QuantumCircuit:
     circuit.x(down_qreg[0])
 
     # Apply modulo exponentiation
-    modulo_power = _power_mod_N(n, N, a)
     circuit.append(modulo_power, circuit.qubits)
 
     # Apply inverse QFT
-    iqft = QFT(len(up_qreg)).inverse().to_gate()
+    iqft = _cache.get(
+        ("iqft", n, approximation_degree),
+        lambda: QFT(n, approximation_degree=approximation_degree).inverse().to_gate(),
+    )
     circuit.append(iqft, up_qreg)
 
     if measurement:
@@ -47,46 +230,637 @@ def shor_circuit(N: int, a: int, measurement=True) -> QuantumCircuit:
     return circuit
 
 
-def _power_mod_N(n:int, N: int, a: int) -> Instruction:
-    """Implements modular exponentiation a^x as an instruction."""
-    up_qreg = QuantumRegister(n, name="up")
+def factor(
+        N: int,
+        bases: Optional[Iterable[int]] = None,
+        num_bases: Optional[int] = None,
+        shots: int = 64,
+        max_workers: Optional[int] = None,
+        semiclassical: bool = False,
+        seed: Optional[int] = None,
+        method: str = "automatic",
+    ) -> dict:
+    """Factors N with Shor's algorithm, simulating one base per worker process.
+
+    Bases are tried in the given order, or in random order among 2, ..., N - 2,
+    keeping at most max_workers circuits in flight. The sweep stops as soon as
+    one base yields a nontrivial factor; a prime N returns at once. Returns a dict with the factors (or
+    None), the successful base, and one entry per base tried with its order
+    and the build, transpile, simulation and post-processing times. method is
+    the AerSimulator method; "matrix_product_state" reaches larger N than the
+    statevector.
+    """
+    result = {"N": N, "factors": None, "base": None, "runs": []}
+
+    # cases where the quantum routine is not needed (or does not work)
+    if N % 2 == 0:
+        result["factors"] = (2, N // 2)
+        return result
+    if _is_prime(N):
+        return result
+    for k in range(2, N.bit_length()):
+        root = _integer_root(N, k)
+        if root ** k == N:
+            result["factors"] = (root, N // root)
+            return result
+
+    if bases is None:
+        bases = np.random.default_rng(seed).permutation(np.arange(2, N - 1)).tolist()
+    bases = [int(a) for a in bases]
+    if num_bases is not None:
+        bases = bases[:num_bases]
+
+    runs = _sweep_bases(N, bases, shots, max_workers, semiclassical, seed, method)
+    try:
+        for run in runs:
+            result["runs"].append(run)
+            if run["factors"] is not None:
+                result["factors"] = run["factors"]
+                result["base"] = run["a"]
+                break
+    finally:
+        runs.close()
+
+    return result
+
+
+def _is_prime(N: int) -> bool:
+    """Miller-Rabin test, deterministic with these bases for N < 3.3 * 10^24."""
+    if N < 2:
+        return False
+    bases = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    if N in bases:
+        return True
+    if any(N % p == 0 for p in bases):
+        return False
+
+    d, s = N - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for base in bases:
+        x = pow(base, d, N)
+        if x in (1, N - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, N)
+            if x == N - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _integer_root(N: int, k: int) -> int:
+    """Largest integer x with x^k <= N, by Newton's method on integers."""
+    if N < 2:
+        return N
+    if k == 2:
+        return math.isqrt(N)
+    # 2^ceil(bits / k) is above the root, and the iteration decreases to it from above
+    x = 1 << -(-N.bit_length() // k)
+    while True:
+        y = ((k - 1) * x + N // x ** (k - 1)) // k
+        if y >= x:
+            return x
+        x = y
+
+
+def _sweep_bases(
+        N: int,
+        bases: list[int],
+        shots: int,
+        max_workers: Optional[int],
+        semiclassical: bool,
+        seed: Optional[int],
+        method: str = "automatic",
+    ) -> Iterator[dict]:
+    """Yields the post-processed run of each base as soon as it finishes.
+
+    At most max_workers bases are simulated at the same time, so closing the
+    generator early leaves little work behind. max_workers=1 runs everything in
+    the calling process.
+    """
+    def lucky_run(a: int) -> Optional[dict]:
+        d = math.gcd(a, N)
+        # the base already shares a factor with N
+        return {"a": a, "order": None, "factors": (d, N // d)} if d > 1 else None
+
+    if max_workers == 1:
+        for a in bases:
+            yield lucky_run(a) or _postprocess_run(
+                _run_shor_base(N, a, shots, semiclassical, seed, method), N
+            )
+        return
+
+    num_workers = max_workers or os.cpu_count() or 1
+    # forking after Aer has started its OpenMP threads can deadlock the workers
+    executor = ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = iter(bases)
+    in_flight = set()
+    try:
+        while True:
+            for a in pending:
+                run = lucky_run(a)
+                if run is not None:
+                    yield run
+                    continue
+                in_flight.add(
+                    executor.submit(_run_shor_base, N, a, shots, semiclassical, seed, method)
+                )
+                if len(in_flight) >= num_workers:
+                    break
+            if not in_flight:
+                return
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _postprocess_run(future.result(), N)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _postprocess_run(run: dict, N: int) -> dict:
+    """Replaces the counts of a run by the order and factors they lead to."""
+    start = time.perf_counter()
+    counts = run.pop("counts")
+    run["order"] = _find_order(counts, N, run["a"])
+    run["factors"] = _factors_from_order(N, run["a"], run["order"])
+    run["postprocess_time"] = time.perf_counter() - start
+    return run
+
+
+def _run_shor_base(
+        N: int, a: int, shots: int, semiclassical: bool, seed: Optional[int],
+        method: str = "automatic",
+    ) -> dict:
+    """Builds, transpiles and simulates the Shor circuit of one base."""
+    start = time.perf_counter()
+    circuit = shor_circuit(N, a, semiclassical=semiclassical)
+    if method == "matrix_product_state":
+        circuit = _reorder_registers(circuit, MPS_REGISTER_ORDER)
+    build_time = time.perf_counter() - start
+
+    simulator = AerSimulator(method=method)
+    start = time.perf_counter()
+    circuit = transpile(circuit, simulator)
+    transpile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts = simulator.run(circuit, shots=shots, seed_simulator=seed).result().get_counts()
+    simulation_time = time.perf_counter() - start
+
+    return {
+        "a": a,
+        "counts": counts,
+        "build_time": build_time,
+        "transpile_time": transpile_time,
+        "simulation_time": simulation_time,
+    }
+
+
+def _order_candidates(measured: np.ndarray, n: int, N: int) -> np.ndarray:
+    """Denominators (<= N) of every continued-fraction convergent of measured / 2^n.
+
+    The expansion is carried out for all measured values at once.
+    """
+    # int64 is exact while the products stay below 2^63
+    dtype = np.int64 if 2 * n < 62 else object
+    num = np.asarray(measured).astype(dtype)
+    den = np.full(num.shape, 2 ** n, dtype=dtype)
+    q_prev = np.ones(num.shape, dtype=dtype)
+    q = np.zeros(num.shape, dtype=dtype)
+
+    candidates = []
+    active = den != 0
+    while active.any():
+        num, den, q_prev, q = num[active], den[active], q_prev[active], q[active]
+        coef = num // den
+        q_prev, q = q, coef * q + q_prev
+        candidates.append(q[q <= N])
+        num, den = den, num - coef * den
+        active = den != 0
+
+    return np.unique(np.concatenate(candidates))
+
+
+def _find_order(counts: dict, N: int, a: int) -> Optional[int]:
+    """Smallest r with a^r = 1 mod N among the candidates read from the counts."""
+    n = N.bit_length()
+    measured = np.array([int(bitstring.replace(" ", ""), 2) for bitstring in counts])
+    # y = 0 carries no information, and the denominator 1 of every expansion would
+    # let the multiples below find any small order whatever was measured
+    measured = measured[measured != 0]
+    if measured.size == 0:
+        return None
+
+    for r in _order_candidates(measured, n, N):
+        r = int(r)
+        if r <= 1:
+            continue
+        for multiple in range(r, min(_ORDER_MULTIPLES * r, N) + 1, r):
+            if pow(a, multiple, N) == 1:
+                return multiple
+    return None
+
+
+def _factors_from_order(N: int, a: int, r: Optional[int]) -> Optional[tuple[int, int]]:
+    """Nontrivial factors of N from an even order r of a, if it gives them."""
+    if r is None or r % 2 == 1:
+        return None
+    x = pow(a, r // 2, N)
+    if x == N - 1:
+        return None
+    for d in (math.gcd(x - 1, N), math.gcd(x + 1, N)):
+        if 1 < d < N:
+            return (d, N // d)
+    return None
+
+
+def shor_distribution(N: int, a: int) -> np.ndarray:
+    """Exact probabilities of the m register of shor_circuit(N, a), without simulating it.
+
+    The modular exponentiation only permutes basis states, so the up register
+    splits into the r residue classes x = x0 mod r of the orbit of a^x mod N. Each
+    class contributes the squared FFT of a comb of period r, and there are only
+    two comb lengths, so two FFTs of size 2^n give the whole distribution.
+    """
+    if math.gcd(a, N) != 1:
+        raise ValueError(f"a={a} is not coprime with N={N}.")
+
+    n = N.bit_length()
+    Q = 2 ** n
+    r = _multiplicative_order(a, N)
+
+    probs = np.zeros(Q)
+    for length, num_classes in ((Q // r + 1, Q % r), (Q // r, r - Q % r)):
+        if num_classes == 0 or length == 0:
+            continue
+        comb = np.zeros(Q)
+        comb[: length * r : r] = 1
+        probs += num_classes * np.abs(np.fft.fft(comb)) ** 2
+
+    return probs / Q ** 2
+
+
+def shor_sample_counts(N: int, a: int, shots: int = 1024, seed: Optional[int] = None) -> dict:
+    """Samples shots from shor_distribution, with the same keys as Aer's get_counts."""
+    n = N.bit_length()
+    probs = shor_distribution(N, a)
+    samples = np.random.default_rng(seed).multinomial(shots, probs / probs.sum())
+    return {format(y, f"0{n}b"): int(c) for y, c in enumerate(samples) if c > 0}
+
+
+def shor_success_probability(N: int, a: int, tol: float = 1e-12) -> float:
+    """Probability that a single shot of shor_circuit(N, a) leads factor to a nontrivial factor."""
+    return _success_probability(shor_distribution(N, a), N, a, tol)
+
+
+def approximation_report(
+        N: int, a: int, degrees: Optional[Iterable[int]] = None, basis_gates=("u", "cx")
+    ) -> list[dict]:
+    """Gate counts and success probability of shor_circuit(N, a) for each approximation_degree.
+
+    Each entry has the operation counts and depth after transpiling to basis_gates,
+    the success probability from a statevector simulation, and its total variation
+    distance to the exact distribution. Meant for small N.
+    """
+    n = N.bit_length()
+    degrees = range(n) if degrees is None else degrees
+    exact = shor_distribution(N, a)
+    simulator = AerSimulator(method="statevector")
+
+    report = []
+    for degree in degrees:
+        circuit = shor_circuit(N, a, measurement=False, approximation_degree=degree)
+        decomposed = transpile(circuit, basis_gates=list(basis_gates), optimization_level=1)
+
+        circuit.save_probabilities(circuit.qregs[0])
+        result = simulator.run(transpile(circuit, simulator)).result()
+        probs = np.asarray(result.data()["probabilities"])
+
+        report.append({
+            "approximation_degree": degree,
+            "count_ops": dict(decomposed.count_ops()),
+            "size": decomposed.size(),
+            "depth": decomposed.depth(),
+            "success_probability": _success_probability(probs, N, a),
+            "total_variation_distance": 0.5 * float(np.abs(probs - exact).sum()),
+        })
+    return report
+
+
+def window_report(
+        N: int, a: int, windows: Iterable[Optional[int]] = (None, 1, 2, 3),
+        basis_gates=("u", "cx"),
+    ) -> list[dict]:
+    """Gate counts and simulation time of shor_circuit(N, a, window=w) for each window.
+
+    window None is the bit-by-bit construction. Each entry has the number of
+    qubits and multiplications, the operation counts and depth after transpiling
+    to basis_gates, the statevector simulation time, and the total variation
+    distance of the m register to the exact distribution. Meant for small N.
+    """
+    n = N.bit_length()
+    exact = shor_distribution(N, a)
+    simulator = AerSimulator(method="statevector")
+
+    report = []
+    for window in windows:
+        circuit = shor_circuit(N, a, measurement=False, window=window)
+        decomposed = transpile(circuit, basis_gates=list(basis_gates), optimization_level=1)
+
+        circuit.save_probabilities(circuit.qregs[0])
+        circuit = transpile(circuit, simulator)
+        start = time.perf_counter()
+        result = simulator.run(circuit).result()
+        simulation_time = time.perf_counter() - start
+        probs = np.asarray(result.data()["probabilities"])
+
+        report.append({
+            "window": window,
+            "num_qubits": circuit.num_qubits,
+            "num_multiplications": n if window is None else -(-n // window),
+            "count_ops": dict(decomposed.count_ops()),
+            "size": decomposed.size(),
+            "depth": decomposed.depth(),
+            "simulation_time": simulation_time,
+            "total_variation_distance": 0.5 * float(np.abs(probs - exact).sum()),
+        })
+    return report
+
+
+def _success_probability(probs: np.ndarray, N: int, a: int, tol: float = 1e-12) -> float:
+    """Weight of the outcomes y that factor's post-processing turns into a nontrivial factor."""
+    n = N.bit_length()
+    success = 0.0
+    for y in np.flatnonzero(probs > tol):
+        order = _find_order({format(y, f"0{n}b"): 1}, N, a)
+        if _factors_from_order(N, a, order) is not None:
+            success += probs[y]
+    return float(success)
+
+
+def _multiplicative_order(a: int, N: int) -> int:
+    """Length of the orbit of a^x mod N starting at x = 0."""
+    r, value = 1, a % N
+    while value != 1:
+        value = (value * a) % N
+        r += 1
+    return r
+
+
+def shor_mps_counts(
+        N: int,
+        a: int,
+        shots: int = 1024,
+        max_bond_dimension: Optional[int] = None,
+        truncation_threshold: float = 1e-16,
+        max_memory_mb: Optional[int] = None,
+        semiclassical: bool = False,
+        approximation_degree: int = 0,
+        register_order: Iterable[str] = MPS_REGISTER_ORDER,
+        seed: Optional[int] = None,
+    ) -> dict:
+    """Counts of the m register of shor_circuit(N, a) simulated as a matrix product state.
+
+    The bond dimension of every cut is capped at max_bond_dimension, and Schmidt
+    values below truncation_threshold are dropped. Returns the counts, the total
+    weight discarded by the truncations (0 for an exact run, summed over the shots
+    for the semiclassical circuit, which is simulated shot by shot), the largest
+    bond dimension reached and the simulation time.
+    """
+    circuit = shor_circuit(
+        N, a, semiclassical=semiclassical, approximation_degree=approximation_degree
+    )
+
+    options = {
+        "matrix_product_state_truncation_threshold": truncation_threshold,
+        "mps_log_data": True,
+    }
+    if max_bond_dimension is not None:
+        options["matrix_product_state_max_bond_dimension"] = max_bond_dimension
+    if max_memory_mb is not None:
+        options["max_memory_mb"] = max_memory_mb
+    simulator = AerSimulator(method="matrix_product_state", **options)
+    circuit = transpile(_reorder_registers(circuit, register_order), simulator)
+
+    previous_log = _mps_log()
+    start = time.perf_counter()
+    result = simulator.run(circuit, shots=shots, seed_simulator=seed).result()
+    simulation_time = time.perf_counter() - start
+    log = _mps_run_log(previous_log, result.results[0].metadata.get("MPS_log_data", ""))
+
+    bond_dimensions = [int(d) for bd in re.findall(r"BD=\[([0-9 ]+)\]", log) for d in bd.split()]
+    return {
+        "counts": result.get_counts(),
+        "truncation_error": sum(float(v) for v in re.findall(r"discarded_value=([-+.0-9eE]+)", log)),
+        "max_bond_dimension": max(bond_dimensions, default=1),
+        "simulation_time": simulation_time,
+    }
+
+
+def _mps_log() -> str:
+    """Entries of the MPS log of Aer so far, which grows with every run of the process."""
+    # Aer only logs circuits with measurements
+    probe = QuantumCircuit(2)
+    probe.cx(0, 1)
+    probe.measure_all()
+    simulator = AerSimulator(method="matrix_product_state", mps_log_data=True)
+    return simulator.run(probe, shots=1).result().results[0].metadata.get("MPS_log_data", "").strip("{} ")
+
+
+def _mps_run_log(previous_log: str, log: str) -> str:
+    """Entries that one run added to the MPS log, read right before it as previous_log."""
+    log = log.strip("{} ")
+    if not log.startswith(previous_log):
+        raise RuntimeError("The MPS log of Aer was cleared or written by another run during the simulation.")
+    log = log[len(previous_log):]
+    if "BD=" not in log:
+        raise RuntimeError("The simulation added no entry to the MPS log of Aer.")
+    return log
+
+
+def _reorder_registers(circuit: QuantumCircuit, register_order: Iterable[str]) -> QuantumCircuit:
+    """Same circuit with its quantum registers laid out in register_order.
+
+    The matrix product state follows the qubit indices, so this sets which
+    registers are neighbours in the chain. Registers not named keep their place
+    after the named ones.
+    """
+    rank = {name: i for i, name in enumerate(register_order)}
+    qregs = sorted(circuit.qregs, key=lambda qreg: rank.get(qreg.name, len(rank)))
+    reordered = QuantumCircuit(*qregs, *circuit.cregs, name=circuit.name)
+    reordered.compose(circuit, qubits=circuit.qubits, clbits=circuit.clbits, inplace=True)
+    return reordered
+
+
+def _semiclassical_shor_circuit(
+        n: int, N: int, a: int, approximation_degree: int = 0, flat: bool = False
+    ) -> QuantumCircuit:
+    """Shor circuit with a single recycled control qubit, 2n + 3 qubits in total.
+
+    The inverse QFT of the up register is done semiclassically (Griffiths-Niu):
+    the multiplier by a^(2^(n-1-k)) is controlled by a fresh |+> qubit, the phases
+    of the previously measured bits are corrected classically, and the qubit is
+    measured into m[k] and reset. The m register has the same distribution as in
+    shor_circuit.
+    """
+    ctrl_qreg = QuantumRegister(1, name="ctrl")
     down_qreg = QuantumRegister(n, name="down")
     aux_qreg = QuantumRegister(n + 2, name="aux")
+    up_cqreg = ClassicalRegister(n, name="m")
+
+    circuit = QuantumCircuit(
+        ctrl_qreg, down_qreg, aux_qreg, up_cqreg, name=f"Shor(N={N}, a={a})"
+    )
+
+    # Initialize down register to 1
+    circuit.x(down_qreg[0])
+
+    if flat:
+        angle_tables, angles_N = _flat_angles(n, N, a, approximation_degree)
+    else:
+        multipliers = _modulo_multipliers(n, N, a, approximation_degree)
+    max_distance = _max_distance(n, approximation_degree)
 
-    circuit = QuantumCircuit(up_qreg, down_qreg, aux_qreg, name=f"{a}^x mod {N}")
+    for k in range(n):
+        if k > 0:
+            circuit.reset(ctrl_qreg[0])
+        circuit.h(ctrl_qreg[0])
+        if flat:
+            _emit(circuit, _controlled_multiple_mod_N_ops(
+                ctrl_qreg[0], down_qreg, aux_qreg, angle_tables[n - 1 - k], angles_N,
+                approximation_degree,
+            ))
+        else:
+            circuit.append(multipliers[n - 1 - k], [ctrl_qreg[0], *down_qreg, *aux_qreg])
 
-    qft = QFT(n + 1, do_swaps=False).to_gate()
-    iqft = qft.inverse()
+        # phase corrections of the inverse QFT conditioned on the bits already measured
+        for l in range(max(0, k - max_distance), k):
+            with circuit.if_test((up_cqreg[l], 1)):
+                circuit.p(-np.pi / 2 ** (k - l), ctrl_qreg[0])
+
+        circuit.h(ctrl_qreg[0])
+        circuit.measure(ctrl_qreg[0], up_cqreg[k])
+
+    return circuit
+
+
+def _power_mod_N(
+        n:int, N: int, a: Optional[int], multipliers: Optional[list[Instruction]] = None,
+        approximation_degree: int = 0,
+    ) -> Instruction:
+    """Implements modular exponentiation a^x as an instruction."""
+    if multipliers is None:
+        multipliers = _modulo_multipliers(n, N, a, approximation_degree)
+
+    up_qreg = QuantumRegister(n, name="up")
+    down_qreg = QuantumRegister(n, name="down")
+    aux_qreg = QuantumRegister(n + 2, name="aux")
 
-    # Create gates to perform addition/subtraction by N in Fourier Space
-    phi_add_N = _phi_add_gate(_get_angles(N, n + 1))
-    iphi_add_N = phi_add_N.inverse()
-    c_phi_add_N = phi_add_N.control(1)
+    circuit = QuantumCircuit(
+        up_qreg, down_qreg, aux_qreg, name=f"{'a' if a is None else a}^x mod {N}"
+    )
 
     # Apply the multiplication gates as showed in
     # the report in order to create the exponentiation
-    for i in range(n):
-        partial_a = pow(a, pow(2, i), N)
-        modulo_multiplier = _controlled_multiple_mod_N(
-            n, N, partial_a, c_phi_add_N, iphi_add_N, qft, iqft
-        )
+    for i, modulo_multiplier in enumerate(multipliers):
         circuit.append(modulo_multiplier, [up_qreg[i], *down_qreg, *aux_qreg])
 
     return circuit.to_instruction()
 
 
+def _modulo_multipliers(n: int, N: int, a: int, approximation_degree: int = 0) -> list[Instruction]:
+    """The n controlled multipliers by a^(2^i) mod N, taken from the cache when possible."""
+    partial_as = [pow(a, pow(2, i), N) for i in range(n)]
+    angle_tables = _power_mod_angles(n, N, partial_as, approximation_degree)
+
+    return [
+        _cache.get(
+            ("cmult", n, N, partial_a, approximation_degree),
+            lambda: _controlled_multiple_mod_N(
+                n, N, partial_a, *_modulo_N_gates(n, N, approximation_degree),
+                angles=angle_tables[i], approximation_degree=approximation_degree,
+            ),
+        )
+        for i, partial_a in enumerate(partial_as)
+    ]
+
+
+def _modulo_N_gates(n: int, N: int, approximation_degree: int = 0) -> tuple[Gate, Gate, Gate, Gate]:
+    """Returns the cached (c_phi_add_N, iphi_add_N, qft, iqft) gates for modulus N."""
+
+    def build():
+        qft = QFT(n + 1, do_swaps=False, approximation_degree=approximation_degree).to_gate()
+        iqft = qft.inverse()
+
+        # Create gates to perform addition/subtraction by N in Fourier Space
+        max_distance = _max_distance(n + 1, approximation_degree)
+        angles_N = _get_angles_batch([N], n + 1, max_distance)[0]
+        phi_add_N = _phi_add_gate(angles_N)
+        iphi_add_N = phi_add_N.inverse()
+        c_phi_add_N = _c_phi_add_gate(angles_N)
+
+        return c_phi_add_N, iphi_add_N, qft, iqft
+
+    return _cache.get(("modulo_N", n, N, approximation_degree), build)
+
+
 def _get_angles(a: int, n: int) -> np.ndarray:
     """Calculates the array of angles to be used in the addition in Fourier Space."""
-    bits_little_endian = (bin(int(a))[2:].zfill(n))[::-1]
+    return _get_angles_batch([a], n)[0]
+
+
+def _max_distance(num_qubits: int, approximation_degree: int) -> int:
+    """Largest i - j whose rotation pi / 2^(i - j) survives qiskit's QFT approximation."""
+    return max(0, num_qubits - 1 - approximation_degree)
 
-    angles = np.zeros(n)
-    for i in range(n):
-        for j in range(i + 1):
-            k = i - j
-            if bits_little_endian[j] == "1":
-                angles[i] += pow(2, -k)
 
-    return angles * np.pi
+def _get_angles_batch(
+        constants: Iterable[int], n: int, max_distance: Optional[int] = None
+    ) -> np.ndarray:
+    """Angle table whose k-th row is _get_angles(constants[k], n).
+
+    angles[k, i] = pi * sum_{j <= i} bit_j(constants[k]) * 2^(j - i), computed
+    as a single product between the bit matrix and a lower-triangular weight matrix.
+    Terms with i - j > max_distance are dropped when it is given.
+    """
+    mask = (1 << n) - 1
+    num_bytes = (n + 7) // 8
+    # little-endian bytes keep arbitrarily large constants exact
+    raw = b"".join((int(c) & mask).to_bytes(num_bytes, "little") for c in constants)
+    bytes_ = np.frombuffer(raw, dtype=np.uint8).reshape(-1, num_bytes)
+    bits = np.unpackbits(bytes_, axis=1, bitorder="little")[:, :n].astype(float)
+
+    k = np.arange(n)
+    distance = k[:, None] - k[None, :]
+    weights = np.tril(np.exp2(-np.abs(distance).astype(float)))
+    if max_distance is not None:
+        weights[distance > max_distance] = 0
+
+    return np.pi * bits @ weights.T
+
+
+def _multiplier_angles(n: int, N: int, a: int, approximation_degree: int = 0) -> np.ndarray:
+    """Angles of every adder in the multiplier by a, shape (2, n, n + 1).
+
+    Row [0, i] adds (2^i a mod N) and row [1, i] subtracts (2^i a^-1 mod N).
+    """
+    return _power_mod_angles(n, N, [a], approximation_degree)[0]
+
+
+def _power_mod_angles(
+        n: int, N: int, partial_as: Iterable[int], approximation_degree: int = 0
+    ) -> np.ndarray:
+    """Angles of every adder of several multipliers, shape (len(partial_as), 2, n, n + 1)."""
+    constants = []
+    for a in partial_as:
+        a_inv = pow(a, -1, mod=N)
+        for constant in (a, a_inv):
+            constants.extend((pow(2, i, N) * constant) % N for i in range(n))
+
+    angles = _get_angles_batch(constants, n + 1, _max_distance(n + 1, approximation_degree))
+    return angles.reshape(-1, 2, n, n + 1)
 
 
 def _phi_add_gate(angles: Union[np.ndarray, ParameterVector]) -> Gate:
@@ -97,6 +871,32 @@ def _phi_add_gate(angles: Union[np.ndarray, ParameterVector]) -> Gate:
     return circuit.to_gate()
 
 
+def _c_phi_add_gate(angles: Union[np.ndarray, ParameterVector]) -> Gate:
+    """Controlled addition by a in Fourier Space, one cp per qubit."""
+    ctrl_qreg = QuantumRegister(1, "ctrl")
+    b_qreg = QuantumRegister(len(angles), "b")
+
+    circuit = QuantumCircuit(ctrl_qreg, b_qreg, name="cphi_add_a")
+    _emit(circuit, _c_phi_add_ops(ctrl_qreg[0], b_qreg, angles))
+    return circuit.to_gate()
+
+
+def _cc_phi_add_gate(angles: Union[np.ndarray, ParameterVector]) -> Gate:
+    """Doubly-controlled addition by a in Fourier Space.
+
+    The phase angle * c0 * c1 * b of each qubit is split into the parities of
+    (c0, c1, b), 4 * c0c1b = c0 + c1 + b - c0^c1 - c0^b - c1^b + c0^c1^b. The
+    parities with b are walked with 4 cx on every qubit of b and the others are
+    shared between all qubits, 4 (n + 1) + 2 cx instead of the 6 (n + 1) of ccp.
+    """
+    ctrl_qreg = QuantumRegister(2, "ctrl")
+    b_qreg = QuantumRegister(len(angles), "b")
+
+    circuit = QuantumCircuit(ctrl_qreg, b_qreg, name="ccphi_add_a")
+    _emit(circuit, _cc_phi_add_ops(ctrl_qreg, b_qreg, angles))
+    return circuit.to_gate()
+
+
 def _double_controlled_phi_add_mod_N(
         angles: Union[np.ndarray, ParameterVector],
         c_phi_add_N: Gate,
@@ -111,8 +911,9 @@ def _double_controlled_phi_add_mod_N(
 
     circuit = QuantumCircuit(ctrl_qreg, b_qreg, flag_qreg, name="ccphi_add_a_mod_N")
 
-    cc_phi_add_a = _phi_add_gate(angles).control(2)
-    cc_iphi_add_a = cc_phi_add_a.inverse()
+    cc_phi_add_a = _cc_phi_add_gate(angles)
+    # same gates with negated angles, in the order of the flat builder
+    cc_iphi_add_a = _cc_phi_add_gate([-angle for angle in angles])
 
     circuit.append(cc_phi_add_a, [*ctrl_qreg, *b_qreg])
 
@@ -138,10 +939,14 @@ def _double_controlled_phi_add_mod_N(
 
 
 def _controlled_multiple_mod_N(
-        n: int, N: int, a: int, c_phi_add_N: Gate, iphi_add_N: Gate, qft: Gate, iqft: Gate
+        n: int, N: int, a: Optional[int], c_phi_add_N: Gate, iphi_add_N: Gate, qft: Gate, iqft: Gate,
+        angles: Optional[np.ndarray] = None, approximation_degree: int = 0,
 ) -> Instruction:
 
     """Implements modular multiplication by a as an instruction."""
+    if angles is None:
+        angles = _multiplier_angles(n, N, a, approximation_degree)
+
     ctrl_qreg = QuantumRegister(1, "ctrl")
     x_qreg = QuantumRegister(n, "x")
     b_qreg = QuantumRegister(n + 1, "b")
@@ -149,22 +954,27 @@ def _controlled_multiple_mod_N(
 
     circuit = QuantumCircuit(ctrl_qreg, x_qreg, b_qreg, flag_qreg, name="cmult_a_mod_N")
 
-    angle_params = ParameterVector("angles", length=n + 1)
-    modulo_adder = _double_controlled_phi_add_mod_N(
-    angle_params, c_phi_add_N, iphi_add_N, qft, iqft
+    def build_adders():
+        angle_params = ParameterVector("angles", length=n + 1)
+        modulo_adder = _double_controlled_phi_add_mod_N(
+            angle_params, c_phi_add_N, iphi_add_N, qft, iqft
+        )
+        return angle_params, modulo_adder, modulo_adder.inverse()
+
+    # the parameterized adder only depends on (n, N), so it is built once and bound per base
+    angle_params, modulo_adder, modulo_adder_inv = _cache.get(
+        ("cc_adder", n, N, approximation_degree), build_adders
     )
 
-    def append_adder(adder: QuantumCircuit, constant: int, idx: int):
-        partial_constant = (pow(2, idx, N) * constant) % N
-        angles = _get_angles(partial_constant, n + 1)
-        bound = adder.assign_parameters({angle_params: angles})
+    def append_adder(adder: QuantumCircuit, adder_angles: np.ndarray, idx: int):
+        bound = adder.assign_parameters({angle_params: adder_angles})
         circuit.append(bound, [*ctrl_qreg, x_qreg[idx], *b_qreg, *flag_qreg])
 
     circuit.append(qft, b_qreg)
 
     # perform controlled addition by a on the aux register in Fourier space
     for i in range(n):
-        append_adder(modulo_adder, a, i)
+        append_adder(modulo_adder, angles[0, i], i)
 
     circuit.append(iqft, b_qreg)
 
@@ -174,12 +984,289 @@ def _controlled_multiple_mod_N(
 
     circuit.append(qft, b_qreg)
 
-    a_inv = pow(a, -1, mod=N)
-
-    modulo_adder_inv = modulo_adder.inverse()
     for i in reversed(range(n)):
-        append_adder(modulo_adder_inv, a_inv, i)
+        append_adder(modulo_adder_inv, angles[1, i], i)
 
     circuit.append(iqft, b_qreg)
 
     return circuit.to_instruction()
+
+
+# Flat builder: the gates of each block are generated as (gate, qubits) pairs
+# and appended directly to the final circuit
+
+_Op = tuple[Gate, tuple[Qubit, ...]]
+
+_H = HGate()
+_X = XGate()
+_CX = CXGate()
+_SWAP = SwapGate()
+_CSWAP = CSwapGate()
+
+
+def _flat_shor_circuit(
+        n: int, N: int, a: int, measurement: bool, approximation_degree: int = 0
+    ) -> QuantumCircuit:
+    """Same circuit as _phase_estimation_circuit, built gate by gate."""
+    up_qreg = QuantumRegister(n, name="up")
+    down_qreg = QuantumRegister(n, name="down")
+    aux_qreg = QuantumRegister(n + 2, name="aux")
+
+    circuit = QuantumCircuit(up_qreg, down_qreg, aux_qreg, name=f"Shor(N={N}, a={a})")
+    circuit.h(up_qreg)
+    circuit.x(down_qreg[0])
+
+    angle_tables, angles_N = _flat_angles(n, N, a, approximation_degree)
+    for i in range(n):
+        _emit(circuit, _controlled_multiple_mod_N_ops(
+            up_qreg[i], down_qreg, aux_qreg, angle_tables[i], angles_N, approximation_degree
+        ))
+
+    _emit(circuit, _inverse_ops(_qft_ops(up_qreg, approximation_degree, swaps=True)))
+
+    if measurement:
+        up_cqreg = ClassicalRegister(n, name="m")
+        circuit.add_register(up_cqreg)
+        circuit.measure(up_qreg, up_cqreg)
+
+    return circuit
+
+
+def _flat_angles(n: int, N: int, a: int, approximation_degree: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Adder angles of the n multipliers by a^(2^i), and of the addition by N."""
+    partial_as = [pow(a, pow(2, i), N) for i in range(n)]
+    angle_tables = _power_mod_angles(n, N, partial_as, approximation_degree)
+    max_distance = _max_distance(n + 1, approximation_degree)
+    angles_N = _get_angles_batch([N], n + 1, max_distance)[0]
+    return angle_tables, angles_N
+
+
+def _emit(circuit: QuantumCircuit, ops: Iterable[_Op]):
+    """Appends the gates without the argument checks of the public methods."""
+    for gate, qubits in ops:
+        circuit._append(gate, qubits, ())
+
+
+def _inverse_ops(ops: Iterable[_Op]) -> Iterator[_Op]:
+    for gate, qubits in reversed(list(ops)):
+        yield gate.inverse(), qubits
+
+
+def _qft_ops(qubits, approximation_degree: int = 0, swaps: bool = False) -> Iterator[_Op]:
+    """Gates of QFT(len(qubits), approximation_degree, do_swaps=swaps), in qiskit's order."""
+    num_qubits = len(qubits)
+    for j in reversed(range(num_qubits)):
+        yield _H, (qubits[j],)
+        num_entanglements = max(0, j - max(0, approximation_degree - (num_qubits - j - 1)))
+        for k in reversed(range(j - num_entanglements, j)):
+            yield CPhaseGate(np.pi * 2.0 ** (k - j)), (qubits[j], qubits[k])
+
+    if swaps:
+        for i in range(num_qubits // 2):
+            yield _SWAP, (qubits[i], qubits[num_qubits - i - 1])
+
+
+def _phi_add_ops(b_qubits, angles) -> Iterator[_Op]:
+    for qubit, angle in zip(b_qubits, angles):
+        yield PhaseGate(angle), (qubit,)
+
+
+def _c_phi_add_ops(ctrl: Qubit, b_qubits, angles) -> Iterator[_Op]:
+    for qubit, angle in zip(b_qubits, angles):
+        yield CPhaseGate(angle), (ctrl, qubit)
+
+
+def _cc_phi_add_ops(ctrl_qubits, b_qubits, angles) -> Iterator[_Op]:
+    """Gates of _cc_phi_add_gate."""
+    c0, c1 = ctrl_qubits
+    quarters = [angle / 4 for angle in angles]
+    total = sum(quarters)
+
+    yield PhaseGate(total), (c0,)
+    yield PhaseGate(total), (c1,)
+    yield _CX, (c0, c1)
+    yield PhaseGate(-total), (c1,)
+    yield _CX, (c0, c1)
+
+    # b, b^c0, b^c0^c1, b^c1 on every qubit of b, layer by layer
+    for sign, ctrl in ((1, c0), (-1, c1), (1, c0), (-1, c1)):
+        for qubit, quarter in zip(b_qubits, quarters):
+            yield PhaseGate(sign * quarter), (qubit,)
+        for qubit in b_qubits:
+            yield _CX, (ctrl, qubit)
+
+
+def _double_controlled_phi_add_mod_N_ops(
+        ctrl_qubits, b_qubits, flag: Qubit, angles: np.ndarray, angles_N: np.ndarray,
+        approximation_degree: int = 0,
+    ) -> Iterator[_Op]:
+    """Gates of _double_controlled_phi_add_mod_N."""
+    yield from _cc_phi_add_ops(ctrl_qubits, b_qubits, angles)
+    yield from _phi_add_ops(b_qubits, -angles_N)
+
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+    yield _CX, (b_qubits[-1], flag)
+    yield from _qft_ops(b_qubits, approximation_degree)
+
+    yield from _c_phi_add_ops(flag, b_qubits, angles_N)
+    yield from _cc_phi_add_ops(ctrl_qubits, b_qubits, -angles)
+
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+    yield _X, (b_qubits[-1],)
+    yield _CX, (b_qubits[-1], flag)
+    yield _X, (b_qubits[-1],)
+    yield from _qft_ops(b_qubits, approximation_degree)
+
+    yield from _cc_phi_add_ops(ctrl_qubits, b_qubits, angles)
+
+
+def _controlled_multiple_mod_N_ops(
+        ctrl: Qubit, x_qubits, aux_qubits, angles: np.ndarray, angles_N: np.ndarray,
+        approximation_degree: int = 0,
+    ) -> Iterator[_Op]:
+    """Gates of _controlled_multiple_mod_N, aux_qubits being b followed by the flag."""
+    n = len(x_qubits)
+    b_qubits, flag = aux_qubits[:n + 1], aux_qubits[n + 1]
+
+    def modulo_adder(adder_angles: np.ndarray, idx: int) -> Iterator[_Op]:
+        return _double_controlled_phi_add_mod_N_ops(
+            (ctrl, x_qubits[idx]), b_qubits, flag, adder_angles, angles_N, approximation_degree
+        )
+
+    yield from _qft_ops(b_qubits, approximation_degree)
+    for i in range(n):
+        yield from modulo_adder(angles[0, i], i)
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+
+    for i in range(n):
+        yield _CSWAP, (ctrl, x_qubits[i], b_qubits[i])
+
+    yield from _qft_ops(b_qubits, approximation_degree)
+    for i in reversed(range(n)):
+        yield from _inverse_ops(modulo_adder(angles[1, i], i))
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+
+
+# Windowed exponentiation: the multiplier by a^(e 2^i) of each window value e is
+# selected by looking the constants up into the table register
+
+def _windowed_shor_circuit(
+        n: int, N: int, a: int, window: int, measurement: bool, approximation_degree: int = 0
+    ) -> QuantumCircuit:
+    """Shor circuit doing one multiplication per window of up qubits, built gate by gate."""
+    up_qreg = QuantumRegister(n, name="up")
+    down_qreg = QuantumRegister(n, name="down")
+    aux_qreg = QuantumRegister(n + 2, name="aux")
+    # constants looked up for each addition, and the qubit flagging the looked-up address
+    table_qreg = QuantumRegister(n, name="table")
+    address_qreg = QuantumRegister(1, name="address")
+
+    circuit = QuantumCircuit(
+        up_qreg, down_qreg, aux_qreg, table_qreg, address_qreg, name=f"Shor(N={N}, a={a})"
+    )
+    circuit.h(up_qreg)
+    circuit.x(down_qreg[0])
+
+    angles_N = _get_angles_batch([N], n + 1, _max_distance(n + 1, approximation_degree))[0]
+    for start in range(0, n, window):
+        window_qubits = up_qreg[start:start + window]
+        # multiplying by c_e = a^(e 2^start) for each value e of the window
+        constants = [pow(a, e << start, N) for e in range(2 ** len(window_qubits))]
+        _emit(circuit, _windowed_multiple_mod_N_ops(
+            window_qubits, down_qreg, aux_qreg, table_qreg, address_qreg[0], N, constants,
+            angles_N, approximation_degree,
+        ))
+
+    _emit(circuit, _inverse_ops(_qft_ops(up_qreg, approximation_degree, swaps=True)))
+
+    if measurement:
+        up_cqreg = ClassicalRegister(n, name="m")
+        circuit.add_register(up_cqreg)
+        circuit.measure(up_qreg, up_cqreg)
+
+    return circuit
+
+
+def _windowed_multiple_mod_N_ops(
+        window_qubits, x_qubits, aux_qubits, table_qubits, address: Qubit, N: int,
+        constants: list[int], angles_N: np.ndarray, approximation_degree: int = 0,
+    ) -> Iterator[_Op]:
+    """Gates multiplying x by constants[e] mod N, e being the value of the window qubits.
+
+    Same steps as _controlled_multiple_mod_N, with the addition of 2^j c_e x_j
+    done by looking 2^j c_e up into the table register when x_j is set, and
+    adding the table to b. Every c_e is invertible, so the swap of x and b needs
+    no control.
+    """
+    n = len(x_qubits)
+    b_qubits, flag = aux_qubits[:n + 1], aux_qubits[n + 1]
+    max_distance = _max_distance(n + 1, approximation_degree)
+    x_bit = 1 << len(window_qubits)
+    inverses = [pow(c, -1, N) for c in constants]
+
+    def lookup_add(values: list[int], idx: int, inverse: bool) -> Iterator[_Op]:
+        address_qubits = (*window_qubits, x_qubits[idx])
+        table = {e | x_bit: (pow(2, idx, N) * value) % N for e, value in enumerate(values)}
+        adder = _table_phi_add_mod_N_ops(
+            table_qubits, b_qubits, flag, angles_N, max_distance, approximation_degree
+        )
+        yield from _lookup_ops(address_qubits, address, table_qubits, table)
+        yield from _inverse_ops(adder) if inverse else adder
+        yield from _lookup_ops(address_qubits, address, table_qubits, table)
+
+    yield from _qft_ops(b_qubits, approximation_degree)
+    for i in range(n):
+        yield from lookup_add(constants, i, inverse=False)
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+
+    for i in range(n):
+        yield _SWAP, (x_qubits[i], b_qubits[i])
+
+    yield from _qft_ops(b_qubits, approximation_degree)
+    for i in reversed(range(n)):
+        yield from lookup_add(inverses, i, inverse=True)
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+
+
+def _lookup_ops(address_qubits, address: Qubit, table_qubits, table: dict[int, int]) -> Iterator[_Op]:
+    """XORs table[k] into the table qubits when the address qubits hold k; its own inverse."""
+    for state, value in table.items():
+        if value == 0:
+            continue
+        flag_address = MCXGate(len(address_qubits), ctrl_state=state)
+        yield flag_address, (*address_qubits, address)
+        for bit in range(len(table_qubits)):
+            if value >> bit & 1:
+                yield _CX, (address, table_qubits[bit])
+        yield flag_address, (*address_qubits, address)
+
+
+def _phi_add_table_ops(table_qubits, b_qubits, max_distance: int) -> Iterator[_Op]:
+    """Adds the table register to b in Fourier Space, with the rotations of _get_angles_batch."""
+    for i, b_qubit in enumerate(b_qubits):
+        for j in range(max(0, i - max_distance), min(i + 1, len(table_qubits))):
+            yield CPhaseGate(np.pi * 2.0 ** (j - i)), (table_qubits[j], b_qubit)
+
+
+def _table_phi_add_mod_N_ops(
+        table_qubits, b_qubits, flag: Qubit, angles_N: np.ndarray, max_distance: int,
+        approximation_degree: int = 0,
+    ) -> Iterator[_Op]:
+    """_double_controlled_phi_add_mod_N_ops adding the table register instead of a constant."""
+    yield from _phi_add_table_ops(table_qubits, b_qubits, max_distance)
+    yield from _phi_add_ops(b_qubits, -angles_N)
+
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+    yield _CX, (b_qubits[-1], flag)
+    yield from _qft_ops(b_qubits, approximation_degree)
+
+    yield from _c_phi_add_ops(flag, b_qubits, angles_N)
+    yield from _inverse_ops(_phi_add_table_ops(table_qubits, b_qubits, max_distance))
+
+    yield from _inverse_ops(_qft_ops(b_qubits, approximation_degree))
+    yield _X, (b_qubits[-1],)
+    yield _CX, (b_qubits[-1], flag)
+    yield _X, (b_qubits[-1],)
+    yield from _qft_ops(b_qubits, approximation_degree)
+
+    yield from _phi_add_table_ops(table_qubits, b_qubits, max_distance)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+On-disk QPY store of built and transpiled Shor circuits.
+
+Usage as a warm-up command:
+    python taller_2_shor_qpy.py 15 63 --basis-gates u,cx --optimization-level 1
+"""
+
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import math
+import mmap
+import os
+from typing import Iterable, Optional, Union
+
+import qiskit
+from qiskit import QuantumCircuit, qpy, transpile
+from qiskit.transpiler import CouplingMap
+
+from ECC2025.cache import DirectoryStore
+
+import taller_2_shor_generico
+from taller_2_shor_generico import shor_circuit
+
+
+DEFAULT_DIRECTORY = os.environ.get(
+    "SHOR_QPY_STORE", os.path.join(os.path.expanduser("~"), ".cache", "ecc2025", "shor_qpy")
+)
+
+
+class ShorCircuitStore(DirectoryStore):
+    """Size-bounded store of Shor circuits serialized with QPY.
+
+    Each entry is a file named after the SHA-256 of its canonical key: the
+    arguments of shor_circuit, basis_gates, coupling_map, optimization_level,
+    the qiskit version and a hash of the source of taller_2_shor_generico, so
+    that editing the generator invalidates the stored circuits. Entries are
+    loaded through a read-only memory map.
+    """
+
+    suffix = ".qpy"
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_bytes: int = 512 * 2**20):
+        super().__init__(directory, max_bytes)
+
+    def key(
+            self,
+            N: int,
+            a: int,
+            measurement: bool = True,
+            basis_gates: Optional[Iterable[str]] = None,
+            coupling_map: Union[CouplingMap, Iterable, None] = None,
+            optimization_level: Optional[int] = None,
+            approximation_degree: int = 0,
+            semiclassical: bool = False,
+            flat: bool = False,
+            window: Optional[int] = None,
+        ) -> str:
+        """Content hash identifying one circuit of the store."""
+        if isinstance(coupling_map, CouplingMap):
+            coupling_map = coupling_map.get_edges()
+        canonical = {
+            "N": N,
+            "a": a,
+            "measurement": bool(measurement),
+            "basis_gates": None if basis_gates is None else sorted(basis_gates),
+            "coupling_map": None if coupling_map is None else sorted(map(list, coupling_map)),
+            "optimization_level": optimization_level,
+            "approximation_degree": approximation_degree,
+            "semiclassical": bool(semiclassical),
+            "flat": bool(flat),
+            "window": window,
+            "qiskit": qiskit.__version__,
+            "generator": _generator_version(),
+        }
+        payload = json.dumps(canonical, sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(
+            self,
+            N: int,
+            a: int,
+            measurement: bool = True,
+            basis_gates: Optional[Iterable[str]] = None,
+            coupling_map: Union[CouplingMap, Iterable, None] = None,
+            optimization_level: Optional[int] = None,
+            approximation_degree: int = 0,
+            semiclassical: bool = False,
+            flat: bool = False,
+            window: Optional[int] = None,
+        ) -> QuantumCircuit:
+        """Loads the circuit from the store, building and storing it on a miss."""
+        key = self.key(
+            N, a, measurement, basis_gates, coupling_map, optimization_level,
+            approximation_degree, semiclassical, flat, window,
+        )
+
+        circuit = self._read(key, _load_qpy)
+        if circuit is not None:
+            return circuit
+
+        circuit = shor_circuit(
+            N, a, measurement=measurement, semiclassical=semiclassical,
+            approximation_degree=approximation_degree, flat=flat, window=window,
+        )
+        if basis_gates is not None or coupling_map is not None or optimization_level is not None:
+            circuit = transpile(
+                circuit,
+                basis_gates=None if basis_gates is None else list(basis_gates),
+                coupling_map=coupling_map,
+                optimization_level=optimization_level,
+                seed_transpiler=0,
+            )
+        self._write(key, lambda file: qpy.dump(circuit, file))
+        return circuit
+
+    def warm_up(self, Ns: Iterable[int], **options) -> int:
+        """Stores the circuits of every coprime base of every composite odd N; returns how many."""
+        num_circuits = 0
+        for N in Ns:
+            if N % 2 == 0 or _is_prime_power(N):
+                continue
+            for a in range(2, N - 1):
+                if math.gcd(a, N) == 1:
+                    self.get(N, a, **options)
+                    num_circuits += 1
+        return num_circuits
+
+
+def _load_qpy(path: str) -> Optional[QuantumCircuit]:
+    """Circuit stored at path, None if the file cannot be read as QPY."""
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return qpy.load(data)[0]
+    except FileNotFoundError:
+        # no entry, DirectoryStore._read tells it apart from a broken one
+        raise
+    except Exception:
+        # truncated or written by an incompatible version, rebuild it
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _generator_version() -> str:
+    """Hash of the source of the module building the circuits."""
+    source = inspect.getsource(taller_2_shor_generico)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def _is_prime_power(N: int) -> bool:
+    """True when N = p^k for a prime p, where Shor's algorithm does not apply."""
+    for p in range(2, math.isqrt(N) + 1):
+        if N % p == 0:
+            while N % p == 0:
+                N //= p
+            return N == 1
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputes the Shor circuits of a range of N.")
+    parser.add_argument("min_N", type=int)
+    parser.add_argument("max_N", type=int)
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--max-bytes", type=int, default=512 * 2**20)
+    parser.add_argument("--basis-gates", default=None, help="comma separated, e.g. u,cx")
+    parser.add_argument("--coupling-map", default=None, help="JSON list of edges")
+    parser.add_argument("--optimization-level", type=int, default=None)
+    parser.add_argument("--no-measurement", action="store_true")
+    parser.add_argument("--approximation-degree", type=int, default=0)
+    parser.add_argument("--semiclassical", action="store_true")
+    parser.add_argument("--flat", action="store_true")
+    parser.add_argument("--window", type=int, default=None)
+    args = parser.parse_args()
+
+    store = ShorCircuitStore(args.directory, args.max_bytes)
+    num_circuits = store.warm_up(
+        range(args.min_N, args.max_N + 1),
+        measurement=not args.no_measurement,
+        basis_gates=None if args.basis_gates is None else args.basis_gates.split(","),
+        coupling_map=None if args.coupling_map is None else json.loads(args.coupling_map),
+        optimization_level=args.optimization_level,
+        approximation_degree=args.approximation_degree,
+        semiclassical=args.semiclassical,
+        flat=args.flat,
+        window=args.window,
+    )
+    print(f"{num_circuits} circuits stored in {store.directory} ({store.size()} bytes)")
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+"""
+Analytic resource estimates of shor_circuit, computed without building it.
+
+Usage:
+    python taller_2_shor_resources.py 15 21 2047 --approximation-degree 2
+    python taller_2_shor_resources.py 15 21 --check
+    python taller_2_shor_resources.py 4087 --check --schedule
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+
+# gates of each logical operation once transpiled to basis_gates=["u", "cx"]
+# with optimization_level=0
+BASIS_COSTS = {
+    "h": {"u": 1},
+    "x": {"u": 1},
+    "p": {"u": 1},
+    "cx": {"cx": 1},
+    "cp": {"u": 3, "cx": 2},
+    "cswap": {"u": 9, "cx": 8},
+    "swap": {"cx": 3},
+    "measure": {"measure": 1},
+    "reset": {"reset": 1},
+    "if_else": {"if_else": 1},
+}
+
+
+def shor_resources(
+        N: int, approximation_degree: int = 0, semiclassical: bool = False
+    ) -> dict:
+    """Qubits, gate counts and depth of shor_circuit(N, a) for any base a.
+
+    The counts do not depend on a. "logical" counts the operations of the
+    circuit once every instruction is unrolled, "basis" the u/cx gates after
+    transpiling to ["u", "cx"] at optimization_level=0. Both are exact. "depth"
+    is the depth of that transpiled circuit from the closed forms of
+    _controlled_multiple_mod_N_depth, which need n >= 3. They were checked
+    exactly against scheduled_depth up to n = 32 and are an extrapolation
+    beyond.
+    """
+    n = N.bit_length()
+    if n < 3:
+        raise ValueError(f"N={N} has fewer than 3 bits, the depth closed forms need n >= 3.")
+    d = approximation_degree
+    if semiclassical:
+        num_qubits = 2 * n + 3
+        # the corrections of k-th bit are the controlled phases of an inverse QFT
+        num_corrections = _num_qft_rotations(n, d)
+        logical = _power_mod_N_resources(n, d) + Counter(
+            h=2 * n, x=1, reset=n - 1, measure=n, if_else=num_corrections
+        )
+        # the steps on the control qubit hide in the multipliers unless the QFTs are cut short
+        depth = _power_mod_N_depth(n, d) + (4 * n - 1 if d >= n else 0)
+    else:
+        num_qubits = 3 * n + 2
+        logical = (
+            _power_mod_N_resources(n, d)
+            + _qft_resources(n, d, swaps=True)
+            + Counter(h=n, x=1, measure=n)
+        )
+        # the inverse QFT hides in the last multiplier unless the QFTs are cut short
+        depth = _power_mod_N_depth(n, d) + (_iqft_depth(n, d) + 2 if d >= n else 0)
+
+    return {
+        "N": N,
+        "n": n,
+        "approximation_degree": d,
+        "semiclassical": semiclassical,
+        "num_qubits": num_qubits,
+        "num_clbits": n,
+        "logical": dict(logical),
+        "basis": dict(_basis_resources(logical)),
+        "depth": depth,
+    }
+
+
+def _basis_resources(logical: Counter) -> Counter:
+    """Basis gate counts of a Counter of logical operations."""
+    basis = Counter()
+    for name, count in logical.items():
+        basis += _scale(Counter(BASIS_COSTS[name]), count)
+    return basis
+
+
+def _scale(counter: Counter, factor: int) -> Counter:
+    return Counter({name: count * factor for name, count in counter.items()})
+
+
+def _num_qft_rotations(num_qubits: int, approximation_degree: int) -> int:
+    """Controlled phases kept by QFT(num_qubits, approximation_degree=...).
+
+    The j-th qubit keeps min(j, max_distance) rotations, as in _max_distance.
+    """
+    max_distance = max(0, num_qubits - 1 - approximation_degree)
+    return max_distance * (max_distance + 1) // 2 + (num_qubits - 1 - max_distance) * max_distance
+
+
+def _qft_resources(num_qubits: int, approximation_degree: int, swaps: bool = False) -> Counter:
+    return Counter(
+        h=num_qubits,
+        cp=_num_qft_rotations(num_qubits, approximation_degree),
+        swap=num_qubits // 2 if swaps else 0,
+    )
+
+
+def _power_mod_N_resources(n: int, approximation_degree: int) -> Counter:
+    """Mirrors _power_mod_N: n controlled multipliers."""
+    return _scale(_controlled_multiple_mod_N_resources(n, approximation_degree), n)
+
+
+def _controlled_multiple_mod_N_resources(n: int, approximation_degree: int) -> Counter:
+    """Mirrors _controlled_multiple_mod_N: 2n modular adders, n cswaps and 4 QFTs."""
+    return (
+        _scale(_double_controlled_phi_add_mod_N_resources(n, approximation_degree), 2 * n)
+        + _scale(_qft_resources(n + 1, approximation_degree), 4)
+        + Counter(cswap=n)
+    )
+
+
+def _double_controlled_phi_add_mod_N_resources(n: int, approximation_degree: int) -> Counter:
+    """Mirrors _double_controlled_phi_add_mod_N on the n + 1 qubits of b.
+
+    Three doubly-controlled adders by a, the adder by -N, the controlled adder
+    by N, 4 QFTs and the comparison with the flag qubit. Approximated angles are
+    zero but their gates are still appended.
+    """
+    m = n + 1
+    return (
+        _scale(_cc_phi_add_resources(m), 3)
+        + Counter(p=m, cp=m, cx=2, x=2)
+        + _scale(_qft_resources(m, approximation_degree), 4)
+    )
+
+
+def _cc_phi_add_resources(num_qubits: int) -> Counter:
+    """Mirrors _cc_phi_add_gate: 4 phases and 4 cx per qubit of b, plus the shared parities."""
+    return Counter(p=4 * num_qubits + 3, cx=4 * num_qubits + 2)
+
+
+def _iqft_depth(num_qubits: int, approximation_degree: int) -> int:
+    """Basis depth of the inverse QFT with its final swaps."""
+    m = num_qubits
+    if approximation_degree >= m - 1:
+        return 4 if m > 1 else 1
+    if approximation_degree == m - 2:
+        return 4 * m
+    return 8 * m - 8
+
+
+def _power_mod_N_depth(n: int, approximation_degree: int) -> int:
+    return n * _controlled_multiple_mod_N_depth(n, approximation_degree)
+
+
+def _controlled_multiple_mod_N_depth(n: int, approximation_degree: int) -> int:
+    """Basis depth of one controlled multiplier, for n >= 3.
+
+    In each regime of the QFTs of the b register two critical paths compete
+    and the depth is the longer one. Up to degree n - 2 each degree saves 4
+    layers, until a path that does not depend on the degree takes over (from
+    n = 16 on at degree n - 2). From degree n - 1 on the QFTs lose their long
+    rotations and the depth drops faster.
+
+    The closed forms were fitted on the circuits with n = 3..16 and checked
+    exactly up to n = 32 against scheduled_depth. For larger n they assume
+    that no third path takes over. For n < 3 they are wrong.
+    """
+    d = approximation_degree
+    if d <= n - 2:
+        return max(78 * n * n + 70 * n - 2 - 4 * d, 78 * n * n + 67 * n - 10)
+    if d == n - 1:
+        return max(54 * n * n + 82 * n + 10, 54 * n * n + 83 * n - 2)
+    return max(18 * n * n + 59 * n + 10, 18 * n * n + 60 * n + 3)
+
+
+def scheduled_depth(
+        N: int, a: int = 2, approximation_degree: int = 0, semiclassical: bool = False
+    ) -> int:
+    """Depth of shor_circuit(N, a) transpiled to ["u", "cx"], without transpiling it.
+
+    The flat circuit, which has the same gates in the same order, is replayed
+    instruction by instruction. Each gate stands for the wires of its own
+    transpiled gates, every other instruction takes one layer on its qubits
+    and clbits, and each wire keeps the layer of its last operation. The result
+    is the longest path of the circuit, exact for any n but in O(n^4) time, so
+    it checks the closed forms rather than replacing them.
+    """
+    from qiskit.circuit import Gate
+
+    shor_circuit = _shor_circuit()
+    circuit = shor_circuit(
+        N, a, semiclassical=semiclassical, approximation_degree=approximation_degree, flat=True
+    )
+
+    wires = {bit: j for j, bit in enumerate([*circuit.qubits, *circuit.clbits])}
+    layers = [0] * len(wires)
+    footprints = {}
+    for instruction in circuit.data:
+        operation = instruction.operation
+        if operation.name == "barrier":
+            continue
+        bits = [wires[bit] for bit in (*instruction.qubits, *instruction.clbits)]
+        if isinstance(operation, Gate):
+            key = (operation.name, operation.num_qubits)
+            if key not in footprints:
+                footprints[key] = _footprint(operation)
+            steps = [[bits[k] for k in step] for step in footprints[key]]
+        else:
+            steps = [bits]
+        for step in steps:
+            layer = max(layers[j] for j in step) + 1
+            for j in step:
+                layers[j] = layer
+    return max(layers)
+
+
+def _footprint(gate) -> list[tuple[int, ...]]:
+    """Qubits of each basis gate of gate, transpiled alone."""
+    from qiskit import QuantumCircuit, transpile
+
+    circuit = QuantumCircuit(gate.num_qubits)
+    circuit.append(gate, circuit.qubits)
+    transpiled = transpile(circuit, basis_gates=["u", "cx"], optimization_level=0)
+    return [
+        tuple(transpiled.find_bit(qubit).index for qubit in instruction.qubits)
+        for instruction in transpiled.data
+    ]
+
+
+def _shor_circuit():
+    # taller_2_shor_generico sits next to this file, wherever it is run from
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    from taller_2_shor_generico import shor_circuit
+
+    return shor_circuit
+
+
+def compare_with_circuit(
+        N: int, a: int, approximation_degree: int = 0, semiclassical: bool = False,
+        schedule: bool = False,
+    ) -> dict:
+    """Estimate and actual basis resources of shor_circuit(N, a), for small N.
+
+    schedule=True takes the actual depth from scheduled_depth and skips the
+    gate counts, which reaches larger N than transpiling the circuit.
+    """
+    estimate = shor_resources(N, approximation_degree, semiclassical)
+    if schedule:
+        estimate = {"depth": estimate["depth"]}
+        actual = {"depth": scheduled_depth(N, a, approximation_degree, semiclassical)}
+        return {"N": N, "a": a, "estimate": estimate, "actual": actual, "match": estimate == actual}
+
+    from qiskit import transpile
+
+    shor_circuit = _shor_circuit()
+    circuit = shor_circuit(
+        N, a, semiclassical=semiclassical, approximation_degree=approximation_degree
+    )
+    transpiled = transpile(circuit, basis_gates=["u", "cx"], optimization_level=0)
+
+    estimate = {"basis": estimate["basis"], "depth": estimate["depth"]}
+    actual = {"basis": dict(transpiled.count_ops()), "depth": transpiled.depth()}
+    return {"N": N, "a": a, "estimate": estimate, "actual": actual, "match": estimate == actual}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimates the resources of shor_circuit.")
+    parser.add_argument("N", type=int, nargs="+")
+    parser.add_argument("--approximation-degree", type=int, default=0)
+    parser.add_argument("--semiclassical", action="store_true")
+    parser.add_argument(
+        "--check", action="store_true",
+        help="compare with the built circuit, base a=2, and exit with status 1 on a mismatch",
+    )
+    parser.add_argument(
+        "--schedule", action="store_true",
+        help="with --check, compare the depth only, with scheduled_depth instead of transpiling",
+    )
+    args = parser.parse_args()
+
+    mismatches = 0
+    for N in args.N:
+        if args.check:
+            result = compare_with_circuit(
+                N, 2, args.approximation_degree, args.semiclassical, args.schedule
+            )
+            mismatches += not result["match"]
+        else:
+            result = shor_resources(N, args.approximation_degree, args.semiclassical)
+        print(json.dumps(result))
+    sys.exit(1 if mismatches else 0)
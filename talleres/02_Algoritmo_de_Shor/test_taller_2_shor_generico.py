@@ -0,0 +1,91 @@
+"""
+Checks of the Shor circuit builder and of its classical post-processing.
+
+Usage:
+    python -m pytest talleres/02_Algoritmo_de_Shor
+"""
+
+import numpy as np
+import pytest
+from qiskit.quantum_info import Operator, Statevector
+
+import taller_2_shor_generico as shor
+
+
+# moduli with n = 2, 3 and 4 bits, and a base coprime with each
+MODULI = [(3, 2), (5, 3), (15, 7)]
+
+
+def _random_angles(n: int) -> np.ndarray:
+    """Angles of an adder on the n + 1 qubits of b."""
+    return np.random.default_rng(n).uniform(-np.pi, np.pi, n + 1)
+
+
+@pytest.mark.parametrize("n", [2, 3, 4])
+def test_c_phi_add_gate(n):
+    angles = _random_angles(n)
+    assert Operator(shor._c_phi_add_gate(angles)) == Operator(shor._phi_add_gate(angles).control(1))
+
+
+@pytest.mark.parametrize("n", [2, 3, 4])
+def test_cc_phi_add_gate(n):
+    angles = _random_angles(n)
+    assert Operator(shor._cc_phi_add_gate(angles)) == Operator(shor._phi_add_gate(angles).control(2))
+
+
+@pytest.mark.parametrize("N, a", MODULI)
+def test_controlled_multiple_mod_N(N, a, monkeypatch):
+    n = N.bit_length()
+    shor.shor_cache_clear()
+    multiplier = shor._controlled_multiple_mod_N(n, N, a, *shor._modulo_N_gates(n, N))
+
+    # the multiplier as it was built from the .control() adders
+    shor.shor_cache_clear()
+    monkeypatch.setattr(shor, "_c_phi_add_gate", lambda angles: shor._phi_add_gate(angles).control(1))
+    monkeypatch.setattr(shor, "_cc_phi_add_gate", lambda angles: shor._phi_add_gate(angles).control(2))
+    reference = shor._controlled_multiple_mod_N(n, N, a, *shor._modulo_N_gates(n, N))
+    shor.shor_cache_clear()
+
+    # the full matrices take minutes from 11 qubits on, two different
+    # unitaries agree on a random state with probability zero
+    rng = np.random.default_rng(N)
+    for _ in range(3):
+        psi = rng.normal(size=2**multiplier.num_qubits) + 1j * rng.normal(size=2**multiplier.num_qubits)
+        psi /= np.linalg.norm(psi)
+        image = Statevector(psi.copy()).evolve(multiplier)
+        assert np.allclose(image.data, Statevector(psi.copy()).evolve(reference).data)
+
+
+@pytest.mark.parametrize("N, a", [(15, 7), (15, 2), (33, 10), (35, 6)])
+def test_uniform_distribution_does_not_factor(N, a):
+    # outcomes that carry no information about the order must not be enough
+    n = N.bit_length()
+    uniform = np.full(2**n, 2.0**-n)
+    assert shor._success_probability(uniform, N, a) < 1
+    assert shor._find_order({"0" * n: 1}, N, a) is None
+
+
+def test_exact_success_probability():
+    # r = 4: the outcomes 4 and 12 give 4, 8 gives its divisor 2 and 0 nothing
+    assert shor.shor_success_probability(15, 7) == pytest.approx(0.75)
+
+
+def test_is_prime():
+    primes = {p for p in range(2, 2000) if all(p % q for q in range(2, p))}
+    assert all(shor._is_prime(N) == (N in primes) for N in range(2000))
+    assert shor._is_prime(2**127 - 1)
+    assert not shor._is_prime((2**61 - 1) * (2**31 - 1))
+
+
+@pytest.mark.parametrize("k", [2, 3, 5])
+def test_integer_root(k):
+    # past 2^53, where the floating-point root is off by more than one
+    root = 3**200 + 1
+    assert shor._integer_root(root**k, k) == root
+    assert shor._integer_root(root**k - 1, k) == root - 1
+
+
+def test_factor_without_circuits():
+    assert shor.factor(13)["factors"] is None
+    assert shor.factor(13)["runs"] == []
+    assert shor.factor((2**61 - 1) ** 3)["factors"] == (2**61 - 1, (2**61 - 1) ** 2)
@@ -0,0 +1,46 @@
+"""
+Checks the analytic estimates of taller_2_shor_resources against the built circuits.
+
+Usage:
+    python -m pytest talleres/02_Algoritmo_de_Shor
+"""
+
+import pytest
+
+from taller_2_shor_resources import compare_with_circuit, scheduled_depth, shor_resources
+
+
+def _degrees(N: int) -> list[int]:
+    """Approximation degrees covering every regime of the closed forms."""
+    n = N.bit_length()
+    return sorted({0, 1, n - 2, n - 1, n, n + 1})
+
+
+@pytest.mark.parametrize("semiclassical", [False, True])
+@pytest.mark.parametrize(
+    "N, approximation_degree", [(N, d) for N in (15, 21, 33) for d in _degrees(N)]
+)
+def test_small_circuits(N, approximation_degree, semiclassical):
+    result = compare_with_circuit(N, 2, approximation_degree, semiclassical)
+    assert result["estimate"] == result["actual"]
+    assert scheduled_depth(N, 2, approximation_degree, semiclassical) == result["actual"]["depth"]
+
+
+def test_large_circuit():
+    # n = 12, where the depth at degree n - 1 switches to its second critical path
+    result = compare_with_circuit(4087, 2, 11)
+    assert result["estimate"] == result["actual"]
+
+
+# the switches of the critical paths, at n = 12 for degree n - 1 and n = 16 for n - 2
+@pytest.mark.parametrize(
+    "N, approximation_degree", [(4087, 0), (4087, 11), (4087, 12), (65535, 14), (65535, 15)]
+)
+def test_scheduled_depth(N, approximation_degree):
+    result = compare_with_circuit(N, 2, approximation_degree, schedule=True)
+    assert result["estimate"] == result["actual"]
+
+
+def test_too_few_bits():
+    with pytest.raises(ValueError):
+        shor_resources(3)
@@ -0,0 +1,165 @@
+"""
+Checks of the helpers behind the verdicts of ECC2025.testing.
+
+Usage:
+    python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.random import random_circuit
+from qiskit.quantum_info import Operator, Statevector
+from qiskit_aer import AerSimulator
+from qiskit_aer.noise import NoiseModel, ReadoutError, depolarizing_error
+
+from ECC2025 import testing
+
+
+SHOTS = 200_000
+
+
+def _device_simulator():
+    return testing._noise_simulator( testing.FakeDevice )
+
+
+def _readout_simulator():
+    """ Readout errors large enough to tell the qubits and the bit order apart. """
+    noise_model = NoiseModel()
+    noise_model.add_all_qubit_quantum_error( depolarizing_error( 0.05, 2 ), ['cx'] )
+    for qubit in range(5):
+        flip0, flip1 = 0.02 * (qubit + 1), 0.05 * (qubit + 1)
+        noise_model.add_readout_error( ReadoutError( [[1 - flip0, flip0], [flip1, 1 - flip1]] ), [qubit] )
+    return AerSimulator( noise_model=noise_model )
+
+
+def _device_circuit( qc, **options ):
+    backend = testing._fake_backend( testing.FakeDevice )
+    return testing._transpile_cached( qc, backend, optimization_level=0, **options )
+
+
+def _reference_circuit():
+    """ The GHZ circuit of test_1b with the swap it needs on the device. """
+    qc = QuantumCircuit( 4 )
+    qc.h(0)
+    qc.cx(0, 1)
+    qc.cx(1, 2)
+    qc.cx(2, 1)
+    qc.cx(1, 2)
+    qc.cx(2, 1)
+    qc.cx(1, 3)
+    qc.measure_all()
+    return qc
+
+
+def _sampled_distance( qc_measured, simulator ):
+    """ Total variation between the exact distribution and the sampled one. """
+    probs = testing._noisy_probabilities( qc_measured, simulator )
+    counts = simulator.run( qc_measured, shots=SHOTS, seed_simulator=3 ).result().get_counts()
+    keys = set(probs) | set(counts)
+    return 0.5 * sum( abs( probs.get(k, 0) - counts.get(k, 0) / SHOTS ) for k in keys )
+
+
+def test_noisy_probabilities_reference_circuit():
+    qc = _device_circuit( _reference_circuit() )
+    assert _sampled_distance( qc, _device_simulator() ) < 0.005
+
+
+def test_noisy_probabilities_permuted_clbits():
+    # clbit k does not hold qubit k, and qubit 2 is not measured
+    qc = QuantumCircuit( 5, 4 )
+    qc.x(0)
+    qc.h(3)
+    qc.cx(3, 4)
+    qc.x(2)
+    for qubit, clbit in zip( [4, 3, 1, 0], [3, 0, 2, 1] ):
+        qc.measure( qubit, clbit )
+    assert _sampled_distance( qc, _readout_simulator() ) < 0.005
+
+
+def test_readout_matrices():
+    noise_model = NoiseModel()
+    default = [[0.9, 0.1], [0.2, 0.8]]
+    own = [[0.95, 0.05], [0.3, 0.7]]
+    noise_model.add_all_qubit_readout_error( ReadoutError( default ) )
+    noise_model.add_readout_error( ReadoutError( own ), [1] )
+
+    readouts = testing._readout_matrices( noise_model )
+    assert np.allclose( readouts[None], default )
+    assert np.allclose( readouts[1], own )
+
+    correlated = NoiseModel()
+    flip = np.eye(4)
+    flip[0] = [0.9, 0.1, 0, 0]
+    correlated.add_readout_error( ReadoutError( flip ), [0, 1] )
+    with pytest.raises( ValueError ):
+        testing._readout_matrices( correlated )
+
+
+def test_1b_exact_verdict( capsys, monkeypatch ):
+    monkeypatch.setenv( 'ECC2025_NO_CACHE', '1' )
+    qc = QuantumCircuit( 4 )
+    qc.h(0)
+    qc.cx(0, 1)
+    qc.cx(1, 2)
+    qc.cx(1, 3)
+
+    testing.test_1b( qc )
+    exact = capsys.readouterr().out
+    testing.test_1b( qc, exact=False )
+    assert exact == capsys.readouterr().out
+
+
+# 2 qubits are compared through the full matrices, 4 through random probes
+@pytest.fixture( params=[2, 4] )
+def circuit( request ):
+    return random_circuit( request.param, 4, max_operands=2, seed=request.param )
+
+
+def _with_global_phase( qc, phase=0.7 ):
+    shifted = qc.copy()
+    shifted.global_phase += phase
+    return shifted
+
+
+def _with_basis_phases( qc ):
+    """ qc preceded by a diagonal, a different phase on each basis input. """
+    shifted = QuantumCircuit( qc.num_qubits )
+    for qubit in range( qc.num_qubits ):
+        shifted.p( 0.3 * (qubit + 1), qubit )
+    return shifted.compose( qc )
+
+
+def test_equivalent_same( circuit ):
+    assert testing._equivalent( circuit, circuit, seed=0 )
+    assert testing._equivalent( circuit, circuit, up_to_phase=False, seed=0 )
+    assert testing._equivalent( circuit, circuit, basis_phases=True, seed=0 )
+
+
+def test_equivalent_global_phase( circuit ):
+    shifted = _with_global_phase( circuit )
+    assert testing._equivalent( shifted, circuit, seed=0 )
+    assert testing._equivalent( shifted, circuit, basis_phases=True, seed=0 )
+    assert not testing._equivalent( shifted, circuit, up_to_phase=False, seed=0 )
+
+
+def test_equivalent_basis_phases( circuit ):
+    shifted = _with_basis_phases( circuit )
+    assert testing._equivalent( shifted, circuit, basis_phases=True, seed=0 )
+    assert not testing._equivalent( shifted, circuit, seed=0 )
+    assert not testing._equivalent( shifted, circuit, up_to_phase=False, seed=0 )
+
+
+def test_equivalent_different( circuit ):
+    other = random_circuit( circuit.num_qubits, 4, max_operands=2, seed=100 )
+    for options in ( {}, {'up_to_phase': False}, {'basis_phases': True} ):
+        assert not testing._equivalent( other, circuit, seed=0, **options )
+
+
+def test_equivalent_targets( circuit ):
+    # the solution as a matrix, the target as a matrix or as a function of the state
+    matrix = Operator( circuit ).to_matrix()
+    assert testing._equivalent( matrix, circuit, seed=0 )
+    assert testing._equivalent( circuit, matrix, up_to_phase=False, seed=0 )
+    assert testing._equivalent( circuit, lambda psi: Statevector( psi ).evolve( circuit ).data, seed=0 )
+    assert not testing._equivalent( circuit, np.eye( 2 ), seed=0 )
@@ -0,0 +1,124 @@
+"""
+Checks of the foldings and extrapolations of ECC2025.zne.
+
+Usage:
+    python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit.random import random_circuit
+from qiskit.primitives import StatevectorEstimator
+from qiskit.quantum_info import Operator, SparsePauliOp
+
+from ECC2025 import zne
+
+
+SCALE_FACTORS = [1, 1.2, 1.4, 2, 3, 3.7, 5]
+
+
+def _circuit(seed: int = 0) -> QuantumCircuit:
+    return random_circuit(3, 4, max_operands=2, seed=seed)
+
+
+def _expected_gates(num_gates: int, scale_factor: float) -> int:
+    """Each fold adds two gates, the count d + 2k closest to d * scale_factor."""
+    return num_gates + 2 * round(num_gates * (scale_factor - 1) / 2)
+
+
+@pytest.mark.parametrize("scale_factor", SCALE_FACTORS)
+def test_fold_global(scale_factor):
+    circuit = _circuit()
+    folded = zne.fold_global(circuit, scale_factor)
+    assert zne._num_gates(folded) == _expected_gates(zne._num_gates(circuit), scale_factor)
+    assert Operator(folded).equiv(Operator(circuit))
+
+
+@pytest.mark.parametrize("order", ["left", "right", "random"])
+@pytest.mark.parametrize("scale_factor", SCALE_FACTORS)
+def test_fold_gates(scale_factor, order):
+    circuit = _circuit()
+    folded = zne.fold_gates(circuit, scale_factor, order=order, seed=1)
+    assert zne._num_gates(folded) == _expected_gates(zne._num_gates(circuit), scale_factor)
+    assert Operator(folded).equiv(Operator(circuit))
+
+
+def test_fold_global_keeps_final_measurements():
+    circuit = _circuit()
+    circuit.measure_all()
+    folded = zne.fold_global(circuit, 3)
+    num_measurements = circuit.num_qubits
+    last = [instruction.operation.name for instruction in folded.data[-num_measurements:]]
+    assert last == num_measurements * ["measure"]
+    assert folded.count_ops()["measure"] == num_measurements
+
+
+def test_fold_global_rejects_mid_circuit_measurements():
+    circuit = QuantumCircuit(1, 1)
+    circuit.h(0)
+    circuit.measure(0, 0)
+    circuit.x(0)
+    with pytest.raises(ValueError):
+        zne.fold_global(circuit, 3)
+
+
+def test_scale_factor_below_one():
+    with pytest.raises(ValueError):
+        zne.fold_gates(_circuit(), 0.5)
+
+
+def test_richardson_extrapolate():
+    # a quadratic through three points is recovered exactly
+    x = np.array([1, 2, 3])
+    assert zne.richardson_extrapolate(x, 0.5 - 0.2 * x + 0.03 * x**2) == pytest.approx(0.5)
+
+
+def test_polynomial_extrapolate():
+    x = np.array([1, 2, 3, 4])
+    assert zne.polynomial_extrapolate(x, 0.5 - 0.2 * x, 1) == pytest.approx(0.5)
+    assert zne.extrapolate(x, 0.5 - 0.2 * x + 0.03 * x**2, "polynomial", 2) == pytest.approx(0.5)
+    with pytest.raises(ValueError):
+        zne.polynomial_extrapolate(x[:2], x[:2], 2)
+
+
+def test_exponential_extrapolate():
+    x = np.array([1, 2, 3, 5])
+    values = 0.1 + 0.6 * np.exp(-0.3 * x)
+    assert zne.exponential_extrapolate(x, values) == pytest.approx(0.7, abs=1e-6)
+    assert zne.exponential_extrapolate(x, values - 0.1, asymptote=0) == pytest.approx(0.6)
+
+
+def test_unknown_extrapolation():
+    with pytest.raises(ValueError):
+        zne.extrapolate([1, 3], [0.1, 0.2], "cubic")
+
+
+def test_zne_batch_single_job():
+    circuits = [_circuit(0), _circuit(1)]
+    observables = [SparsePauliOp("ZZI"), SparsePauliOp("XIX")]
+
+    class CountingEstimator(StatevectorEstimator):
+        jobs = 0
+
+        def run(self, pubs, **kwargs):
+            CountingEstimator.jobs += 1
+            return super().run(pubs, **kwargs)
+
+    results = zne.zne_batch(
+        circuits, observables, CountingEstimator(), scale_factors=(1, 2, 3), folding="gates"
+    )
+    assert CountingEstimator.jobs == 1
+    for circuit, observable, result in zip(circuits, observables, results):
+        # without noise every scale factor gives the ideal value
+        ideal = StatevectorEstimator().run([(circuit, observable)]).result()[0].data.evs
+        assert result["value"] == pytest.approx(float(ideal), abs=1e-9)
+        assert result["scale_factors"][0] == 1
+
+
+def test_zne_batch_duplicate_scale_factors():
+    circuit = QuantumCircuit(1)
+    circuit.h(0)
+    circuit.s(0)
+    with pytest.raises(ValueError, match="both reach"):
+        zne.zne(circuit, SparsePauliOp("Z"), StatevectorEstimator(), scale_factors=(1, 1.5, 2))